@@ -0,0 +1,70 @@
+'''Measures how settings commands keep up with fast scrolling.
+
+Run from the repository root:
+
+    python -m benchmarks.control_coalescing
+
+A burst of display brightness changes, as caused by scrolling, is sent to a
+simulated device whose control messages take a few milliseconds.  "before"
+waits for each command like G19 did before coalescing, "after" uses the
+asynchronous, coalescing setters.  Reported are the number of control
+messages transmitted and the time from the last scroll tick until the
+device had the final value.
+
+'''
+from logitech.g19 import G19
+from logitech.g19_sim import (SimulatedG19UsbController, UsbBusModel)
+
+import time
+
+
+def _scroll(ticks, tickInterval, latency, wait):
+    device = SimulatedG19UsbController(UsbBusModel(latency=latency))
+    lg19 = G19(usbDevice=device)
+    if wait:
+        # there was no rate limit either
+        lg19.set_max_control_rate(None)
+    future = None
+    start = time.time()
+    for i in range(ticks):
+        future = lg19.set_display_brightness(i % 101)
+        if wait:
+            future.result()
+        time.sleep(tickInterval)
+    future.result()
+    # when the user made the last change, which is later than that if the
+    # setter blocked
+    lastChange = start + ticks * tickInterval
+    stats = lg19.get_control_statistics()['displayBrightness']
+    return {'lagMs': 1000 * (time.time() - lastChange),
+            'messages': len(device.get_control_messages()),
+            'coalesced': stats['coalesced']}
+
+
+def measure(ticks=100, tickInterval=0.002, latency=0.005):
+    '''Runs the benchmark.
+
+    @param ticks Number of brightness changes.
+    @param tickInterval Time between changes in seconds.
+    @param latency Duration of a control message in seconds.
+    @return Dictionary mapping 'before' and 'after' to dictionaries
+    containing the number of control messages transmitted ('messages') and
+    values coalesced ('coalesced'), and the time from the last change until
+    the final value was transmitted in milliseconds ('lagMs').
+
+    '''
+    return {'before': _scroll(ticks, tickInterval, latency, True),
+            'after': _scroll(ticks, tickInterval, latency, False)}
+
+
+def main(ticks=100):
+    results = measure(ticks)
+    for name in ["before", "after"]:
+        result = results[name]
+        print "{0:>6}: {1:4d} messages, {2:4d} coalesced, lag {3:7.2f} ms" \
+                .format(name, result['messages'], result['coalesced'],
+                        result['lagMs'])
+
+
+if __name__ == '__main__':
+    main()
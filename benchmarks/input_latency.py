@@ -0,0 +1,144 @@
+'''Measures key-to-processor latency and idle wakeups of G19Receiver.
+
+Run from the repository root:
+
+    python -m benchmarks.input_latency
+
+A simulated device delivers multimedia key packets at random points in
+time.  The time until an input processor sees the event is reported for the
+receiver and for the 30 ms polling loop it replaced ("before"), along with
+the number of endpoint reads per second while no key is pressed.
+
+'''
+from logitech.g19 import G19
+from logitech.g19_receivers import (InputProcessor, State)
+from logitech.g19_sim import (SimulatedG19UsbController, UsbBusModel)
+from logitech.runnable import Runnable
+
+import random
+import threading
+import time
+
+
+class _LatencyRecorder(InputProcessor):
+    '''Records the time each event took since its packet was sent.'''
+
+    def __init__(self):
+        self.sentAt = None
+        self.latencies = []
+        self.received = threading.Event()
+
+    def process_input(self, inputEvent):
+        self.latencies.append(time.time() - self.sentAt)
+        self.received.set()
+        return True
+
+
+class _Applet(object):
+    '''Minimal applet wrapping an input processor.'''
+
+    def __init__(self, processor):
+        self.__processor = processor
+
+    def get_input_processor(self):
+        return self.__processor
+
+
+class _PollingReceiver(Runnable):
+    '''The polling loop G19Receiver used before, for comparison.'''
+
+    def __init__(self, g19, processor):
+        Runnable.__init__(self)
+        self.__g19 = g19
+        self.__processor = processor
+        self.__state = State()
+
+    def execute(self):
+        gotData = False
+        data = self.__g19.read_multimedia_keys()
+        if data:
+            self.__processor.process_input(
+                    self.__state.packet_received_mm(data))
+            gotData = True
+        if self.__g19.read_g_and_m_keys():
+            gotData = True
+        if self.__g19.read_display_menu_keys():
+            gotData = True
+        if not gotData:
+            time.sleep(0.03)
+
+
+def _measure(device, recorder, start, stop, presses, idleTime):
+    start()
+    try:
+        time.sleep(0.1)
+        readsBefore = device.get_statistics()['reads']
+        time.sleep(idleTime)
+        wakeups = (device.get_statistics()['reads'] - readsBefore) / idleTime
+
+        for i in range(presses):
+            time.sleep(random.uniform(0.01, 0.1))
+            for data in ([1, 0x08], [1, 0x00]):
+                recorder.received.clear()
+                recorder.sentAt = time.time()
+                device.feed_packet(0x82, data)
+                recorder.received.wait(1.0)
+    finally:
+        stop()
+
+    latencies = sorted(recorder.latencies)
+    return {'meanMs': 1000 * sum(latencies) / len(latencies),
+            'medianMs': 1000 * latencies[len(latencies) // 2],
+            'maxMs': 1000 * latencies[-1],
+            'idleReadsPerSecond': wakeups}
+
+
+def measure(presses=50, idleTime=3.0):
+    '''Runs the benchmark.
+
+    @return Dictionary mapping 'before' and 'receiver' to dictionaries
+    containing the mean, median and maximum latency in milliseconds
+    ('meanMs', 'medianMs', 'maxMs') and the endpoint reads per second while
+    idle ('idleReadsPerSecond').
+
+    '''
+    # only the receiver is measured, not the bus
+    device = SimulatedG19UsbController(UsbBusModel(float('inf'), 0))
+    lg19 = G19(usbDevice=device)
+    recorder = _LatencyRecorder()
+    poller = _PollingReceiver(lg19, recorder)
+    pollerThread = []
+
+    def start_polling():
+        poller.start()
+        pollerThread.append(threading.Thread(target=poller.run))
+        pollerThread[0].start()
+
+    def stop_polling():
+        poller.stop()
+        pollerThread[0].join()
+
+    results = {}
+    results["before"] = _measure(device, recorder, start_polling,
+            stop_polling, presses, idleTime)
+
+    recorder = _LatencyRecorder()
+    lg19.add_applet(_Applet(recorder))
+    results["receiver"] = _measure(device, recorder,
+            lg19.start_event_handling, lg19.stop_event_handling, presses,
+            idleTime)
+    return results
+
+
+def main(presses=50, idleTime=3.0):
+    results = measure(presses, idleTime)
+    for name in ["before", "receiver"]:
+        result = results[name]
+        print "{0:>8}: latency mean {1:6.2f} ms, median {2:6.2f} ms, " \
+                "max {3:6.2f} ms; {4:5.1f} reads/s while idle".format(
+                        name, result['meanMs'], result['medianMs'],
+                        result['maxMs'], result['idleReadsPerSecond'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+'''Compares key packet decoding throughput with the loop based decoder.
+
+Run from the repository root:
+
+    python -m benchmarks.key_decoding
+
+"before" is the nested loop decoding State used before the lookup tables.
+
+'''
+from logitech.g19_keys import (Data, Key)
+from logitech.g19_receivers import State
+
+import timeit
+
+
+def _legacy_data_to_keys_g_and_m(data):
+    '''G/M decoding as done before the lookup tables.'''
+    if len(data) != 4 or data[0] != 2:
+        raise ValueError("not a multimedia key packet: " + str(data))
+    empty = 0x400000
+    curVal = data[3] << 16 | data[2] << 8 | data[1]
+    keys = []
+    while curVal != empty:
+        foundAKey = False
+        for val in Data.gmKeys.keys():
+            if val & curVal == val:
+                curVal ^= val
+                keys.append(Data.gmKeys[val])
+                foundAKey = True
+        if not foundAKey:
+            raise ValueError("incorrect g/m key packet: " + str(data))
+    return set(keys)
+
+
+def _legacy_data_to_keys_mm(data):
+    '''Multimedia key decoding as done before the lookup tables.'''
+    if len(data) != 2 or data[0] not in [1, 3]:
+        raise ValueError("not a multimedia key packet: " + str(data))
+    if data[0] == 1:
+        curVal = data[1]
+        keys = []
+        while curVal:
+            foundAKey = False
+            for val in Data.mmKeys.keys():
+                if val & curVal == val:
+                    curVal ^= val
+                    keys.append(Data.mmKeys[val])
+                    foundAKey = True
+            if not foundAKey:
+                raise ValueError("incorrect multimedia key packet: " +
+                        str(data))
+    elif data == [3, 1]:
+        keys = [Key.WINKEY_SWITCH]
+    elif data == [3, 0]:
+        keys = []
+    else:
+        raise ValueError("incorrect multimedia key packet: " + str(data))
+    return set(keys)
+
+
+# typical traffic: presses and releases of single and combined keys
+G_AND_M_PACKETS = [[2, 0x04, 0x00, 0x40], [2, 0x00, 0x00, 0x40],
+                   [2, 0x03, 0x04, 0x40], [2, 0x00, 0x10, 0x40],
+                   [2, 0x00, 0x00, 0x48]]
+MM_PACKETS = [[1, 0x20], [1, 0x00], [1, 0x21], [1, 0x01], [1, 0x40],
+              [3, 1], [3, 0]]
+
+
+def _packets_per_second(decode, packets, rounds):
+    def run():
+        for data in packets:
+            decode(data)
+    duration = min(timeit.repeat(run, number=rounds, repeat=3))
+    return len(packets) * rounds / duration
+
+
+def measure(rounds=20000):
+    '''Runs the benchmark.
+
+    @return Dictionary mapping 'g/m' and 'mm' to dictionaries containing the
+    packets decoded per second by the loop based decoder ('before'), to key
+    sets ('keys') and to bitmasks ('mask'), and the input events created per
+    second ('events').
+
+    '''
+    state = State()
+    results = {}
+    for name, packets, legacy, current, currentMask, received in [
+            ("g/m", G_AND_M_PACKETS, _legacy_data_to_keys_g_and_m,
+                    state._data_to_keys_g_and_m,
+                    state._data_to_mask_g_and_m,
+                    state.packet_received_g_and_m),
+            ("mm", MM_PACKETS, _legacy_data_to_keys_mm,
+                    state._data_to_keys_mm, state._data_to_mask_mm,
+                    state.packet_received_mm)]:
+        results[name] = {
+                'before': _packets_per_second(legacy, packets, rounds),
+                'keys': _packets_per_second(current, packets, rounds),
+                'mask': _packets_per_second(currentMask, packets, rounds),
+                'events': _packets_per_second(received, packets, rounds)}
+    return results
+
+
+def main(rounds=20000):
+    results = measure(rounds)
+    for name in ["g/m", "mm"]:
+        result = results[name]
+        print "{0:>4}: before {1:10.0f} packets/s, now {2:10.0f} packets/s " \
+                "({3:.1f}x), {4:10.0f} as bitmask, {5:10.0f} events/s" \
+                .format(name, result['before'], result['keys'],
+                        result['keys'] / result['before'], result['mask'],
+                        result['events'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+'''Checks that input keeps flowing while the display interface is saturated.
+
+Run from the repository root:
+
+    python -m benchmarks.lock_stress
+
+Several threads keep the LCD bulk endpoint busy with frames taking 20 ms each
+to transmit, while others change the backlight and read the G/M and
+multimedia keys.  The latencies of the latter are reported; the exit status
+is 1 if any of them had to wait for a frame transfer.
+
+'''
+from logitech import g19_frame
+from logitech.g19 import G19
+
+import sys
+import threading
+import time
+
+FRAME_TIME = 0.02
+OPERATION_TIME = 0.001
+
+
+class _SlowHandle(object):
+    '''USB handle stub taking fixed times per transfer.'''
+
+    def bulkWrite(self, endpoint, data, timeout):
+        time.sleep(FRAME_TIME)
+        return len(data)
+
+    def controlMsg(self, *args):
+        time.sleep(OPERATION_TIME)
+        return 0
+
+    def interruptRead(self, endpoint, maxLen, timeout):
+        time.sleep(OPERATION_TIME)
+        return []
+
+
+class _SlowController(object):
+    '''Controller stub providing the handles of a G19UsbController.'''
+
+    def __init__(self):
+        self.handleIf0 = _SlowHandle()
+        self.handleIf1 = _SlowHandle()
+        self.handleIfMM = _SlowHandle()
+
+    def reset(self):
+        pass
+
+
+def _repeat(func, duration, latencies):
+    '''Calls func until duration is over, appending its latencies.'''
+    end = time.time() + duration
+    while time.time() < end:
+        start = time.time()
+        func()
+        latencies.append(time.time() - start)
+
+
+def _bg_color_setter(lg19, index):
+    '''Returns a function setting the backlight and waiting for it.
+
+    It alternates between two colors no other setter uses, so no call is
+    suppressed as setting the color the backlight has already.
+
+    '''
+    colors = [(255, index, 0), (255, index, 1)]
+    def set_bg_color():
+        colors.reverse()
+        lg19.set_bg_color(*colors[0]).result()
+    return set_bg_color
+
+
+def measure(duration=3.0, frameThreads=4, controlThreads=1):
+    '''Runs the benchmark.
+
+    @return Dictionary mapping the operations to dictionaries containing
+    the number of calls done ('calls') and their mean and maximum latency in
+    milliseconds ('meanMs', 'maxMs').  The entry of set_bg_color also
+    contains the number of calls suppressed as unchanged ('suppressed'),
+    which should be 0.
+
+    '''
+    lg19 = G19(usbDevice=_SlowController())
+    # every call is to be transmitted
+    lg19.set_max_control_rate(None)
+    frame = g19_frame.FrameBuffer()
+    operations = [("frame", lambda: lg19.send_frame(frame, True))] * \
+            frameThreads
+    operations += [("set_bg_color", _bg_color_setter(lg19, index))
+            for index in range(controlThreads)]
+    operations += [
+            ("read_g_and_m_keys", lg19.read_g_and_m_keys),
+            ("read_multimedia_keys", lg19.read_multimedia_keys)]
+
+    latencies = {}
+    threads = []
+    for name, func in operations:
+        values = latencies.setdefault(name, [])
+        t = threading.Thread(target=_repeat, args=(func, duration, values))
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join()
+
+    results = {}
+    for name, values in latencies.items():
+        results[name] = {'calls': len(values),
+                'meanMs': 1000 * sum(values) / len(values),
+                'maxMs': 1000 * max(values)}
+    results['set_bg_color']['suppressed'] = \
+            lg19.get_control_statistics()['bgColor']['suppressed']
+    return results
+
+
+def main(duration=3.0, frameThreads=4):
+    failed = False
+    for name, result in sorted(measure(duration, frameThreads).items()):
+        print "{0:>22}: {1:6d} calls, mean {2:7.2f} ms, max {3:7.2f} ms" \
+                .format(name, result['calls'], result['meanMs'],
+                        result['maxMs'])
+        if name != "frame" and result['maxMs'] >= 1000 * FRAME_TIME:
+            failed = True
+    print "FAILED" if failed else "OK"
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+'''Measures how fast G19 is usable again after the device was unplugged.
+
+Run from the repository root:
+
+    python -m benchmarks.reconnect
+
+A simulated device is unplugged while G19 reads keys, and plugged in again
+after outages of different lengths.  Reported is the time from plugging it
+in until G19 reopened it and had its settings sent again.
+
+'''
+from logitech.g19 import G19
+from logitech.g19_sim import (SimulatedG19UsbController, UsbBusModel)
+
+import sys
+import time
+
+# longest time a reconnect may take
+TARGET = 1.0
+
+
+def _outage(device, duration):
+    '''Unplugs the device for duration seconds.
+
+    @return Seconds from plugging the device in until its settings were sent
+    again.
+
+    '''
+    device.unplug()
+    time.sleep(duration)
+    messages = len(device.get_control_messages())
+    device.plug()
+    start = time.time()
+    # waiting for the restored backlight color covers reopening the device
+    while len(device.get_control_messages()) == messages:
+        if time.time() - start > 10 * TARGET:
+            raise RuntimeError("device not reconnected")
+        time.sleep(0.001)
+    return time.time() - start
+
+
+def measure(outages=(0.0, 0.05, 0.5, 2.0)):
+    '''Runs the benchmark.
+
+    @param outages Durations the device is unplugged for in seconds.
+    @return Dictionary mapping the outage durations (as str) to the seconds
+    until the device was back ('seconds'), plus the connection statistics of
+    G19 ('statistics', see G19.get_connection_statistics()).
+
+    '''
+    device = SimulatedG19UsbController(UsbBusModel(float('inf'), 0))
+    lg19 = G19(usbDevice=device)
+    lg19.set_bg_color(255, 0, 0).result()
+    lg19.start_event_handling()
+    try:
+        results = {}
+        for duration in outages:
+            results[str(duration)] = {
+                    'seconds': _outage(device, duration)}
+        results['statistics'] = lg19.get_connection_statistics()
+        return results
+    finally:
+        lg19.stop_event_handling()
+
+
+def main():
+    results = measure()
+    failed = False
+    for name in sorted((name for name in results if name != 'statistics'),
+            key=float):
+        seconds = results[name]['seconds']
+        print "{0:>6} s unplugged: back after {1:7.3f} s".format(name,
+                seconds)
+        if seconds >= TARGET:
+            failed = True
+    print "FAILED" if failed else "OK"
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,130 @@
+'''Compares the per-frame cost of the different send_frame() inputs.
+
+Run from the repository root:
+
+    python -m benchmarks.send_frame
+
+"before" is the list based packing send_frame() used to do for every frame.
+Allocations are measured with tracemalloc where available; otherwise the
+size of every buffer handed to USB which is not reused from the previous
+frame is counted.
+
+'''
+from logitech import g19_frame
+from logitech.g19 import G19
+
+import sys
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+class _RecordingHandle(object):
+    '''USB handle stub remembering the buffers written to it.'''
+
+    def __init__(self):
+        self.lastBuffer = None
+        self.newBuffers = 0
+        self.newBytes = 0
+
+    def bulkWrite(self, endpoint, data, timeout):
+        if data is not self.lastBuffer:
+            self.newBuffers += 1
+            self.newBytes += sys.getsizeof(data)
+        self.lastBuffer = data
+        return len(data)
+
+
+class _RecordingController(object):
+    '''Controller stub providing the handles of a G19UsbController.'''
+
+    def __init__(self):
+        self.handleIf0 = _RecordingHandle()
+        self.handleIf1 = _RecordingHandle()
+        self.handleIfMM = _RecordingHandle()
+
+
+def _legacy_send_frame(handle, data):
+    '''Packing done by send_frame() before FrameBuffer existed.'''
+    frame = [0x10, 0x0F, 0x00, 0x58, 0x02, 0x00, 0x00, 0x00,
+             0x00, 0x00, 0x00, 0x3F, 0x01, 0xEF, 0x00, 0x0F]
+    for i in range(16, 256):
+        frame.append(i)
+    for i in range(256):
+        frame.append(i)
+    frame += data
+    handle.bulkWrite(2, frame, 1000)
+
+
+def _measure(handle, send, rounds):
+    handle.lastBuffer = None
+    # warm up, so buffers allocated once are not accounted
+    send()
+    handle.newBuffers = 0
+    handle.newBytes = 0
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    for i in range(rounds):
+        send()
+    duration = time.time() - start
+    peak = None
+    if tracemalloc:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {'msPerFrame': 1000.0 * duration / rounds,
+            'newBuffersPerFrame': float(handle.newBuffers) / rounds,
+            'bytesPerFrame': float(handle.newBytes) / rounds,
+            'peakTracedBytes': peak}
+
+
+def measure(rounds=200):
+    '''Runs the benchmark.
+
+    @return Dictionary mapping the input types to dictionaries containing
+    the time per frame ('msPerFrame'), the buffers and bytes newly handed to
+    USB per frame ('newBuffersPerFrame', 'bytesPerFrame') and the peak
+    traced memory ('peakTracedBytes', None without tracemalloc).
+
+    '''
+    controller = _RecordingController()
+    handle = controller.handleIf0
+    lg19 = G19(usbDevice=controller)
+
+    listData = [0x1f, 0xf8] * (g19_frame.WIDTH * g19_frame.HEIGHT)
+    byteData = bytearray(listData)
+    frame = g19_frame.FrameBuffer(byteData)
+
+    results = {}
+    results["before"] = _measure(handle,
+            lambda: _legacy_send_frame(handle, listData), rounds)
+    # force, as unchanged frames would not be transmitted at all
+    results["list"] = _measure(handle,
+            lambda: lg19.send_frame(listData, True), rounds)
+    results["bytearray"] = _measure(handle,
+            lambda: lg19.send_frame(byteData, True), rounds)
+    results["FrameBuffer"] = _measure(handle,
+            lambda: lg19.send_frame(frame, True), rounds)
+    return results
+
+
+def main(rounds=200):
+    results = measure(rounds)
+    for name in ["before", "list", "bytearray", "FrameBuffer"]:
+        result = results[name]
+        print "{0:>12}: {1:8.3f} ms/frame, {2:6.2f} new buffers/frame, " \
+                "{3:10.0f} bytes allocated/frame".format(
+                        name, result['msPerFrame'],
+                        result['newBuffersPerFrame'],
+                        result['bytesPerFrame']),
+        if result['peakTracedBytes'] is not None:
+            print ", peak traced {0} bytes".format(result['peakTracedBytes'])
+        else:
+            print
+
+
+if __name__ == '__main__':
+    main()
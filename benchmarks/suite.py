@@ -0,0 +1,254 @@
+'''Runs all benchmarks against a simulated device and reports them as JSON.
+
+Run from the repository root:
+
+    python -m benchmarks.suite -o results.json
+
+Single benchmarks can be selected by giving their names as arguments.  To
+compare with the results of another revision, pass them via --compare; the
+ratio now / before of every value is printed then.
+
+'''
+from benchmarks import control_coalescing
+from benchmarks import input_latency
+from benchmarks import key_decoding
+from benchmarks import lock_stress
+from benchmarks import reconnect
+from benchmarks import send_frame
+from benchmarks import xplanet_handoff
+from logitech import g19_frame
+from logitech.g19 import G19
+from logitech.g19_sim import (SimulatedG19UsbController, UsbBusModel)
+
+import PIL.Image as Img
+import distutils.spawn
+import json
+import optparse
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+
+def _calls_per_second(func, rounds):
+    duration = min(timeit.repeat(func, number=rounds, repeat=3))
+    return rounds / duration
+
+
+def _make_g19():
+    '''Creates a G19 on a simulated device with an infinitely fast bus.'''
+    return G19(usbDevice=SimulatedG19UsbController(
+            UsbBusModel(float('inf'), 0), maxFrames=1))
+
+
+def bench_convert_image_to_frame():
+    img = Img.frombuffer('RGB', (g19_frame.WIDTH, g19_frame.HEIGHT),
+            os.urandom(g19_frame.WIDTH * g19_frame.HEIGHT * 3), 'raw', 'RGB',
+            0, 1)
+    handle, filename = tempfile.mkstemp('.bmp')
+    os.close(handle)
+    try:
+        img.save(filename)
+        return {'fromFilePerSecond': _calls_per_second(
+                        lambda: G19.convert_image_to_frame(filename), 20),
+                'fromImagePerSecond': _calls_per_second(
+                        lambda: g19_frame.image_to_frame(img), 20)}
+    finally:
+        os.remove(filename)
+
+
+def bench_rgb_to_uint16():
+    return {'callsPerSecond': _calls_per_second(
+            lambda: G19.rgb_to_uint16(255, 128, 7), 100000)}
+
+
+def bench_fill_display_with_color():
+    lg19 = _make_g19()
+    colors = [(255, 0, 0), (0, 0, 255)]
+    def fill():
+        # alternating, as unchanged frames would not be transmitted
+        colors.reverse()
+        lg19.fill_display_with_color(*colors[0])
+    return {'callsPerSecond': _calls_per_second(fill, 50)}
+
+
+def bench_set_display_colorful():
+    lg19 = _make_g19()
+    return {'callsPerSecond': _calls_per_second(lg19.set_display_colorful,
+            1)}
+
+
+def bench_send_frame():
+    return send_frame.measure(100)
+
+
+def bench_key_decoding():
+    return key_decoding.measure(5000)
+
+
+def bench_input_latency():
+    return input_latency.measure(presses=20, idleTime=1.0)
+
+
+def bench_control_coalescing():
+    return control_coalescing.measure()
+
+
+def bench_data_store_update():
+    if distutils.spawn.find_executable('xplanet') is None:
+        return {'skipped': "xplanet not found"}
+    from logitech.applets.xplanet.xplanet import DataStore
+    dataStore = DataStore()
+    start = time.time()
+    dataStore.update()
+    return {'seconds': time.time() - start,
+            'frames': len(dataStore.get_data())}
+
+
+def bench_qimage_to_frame():
+    try:
+        from PyQt4 import QtGui
+        from logitech import g19_qt
+    except ImportError:
+        return {'skipped': "PyQt4 not found"}
+    img = QtGui.QImage(g19_frame.WIDTH, g19_frame.HEIGHT,
+            QtGui.QImage.Format_RGB16)
+    img.fill(0x1234)
+    frameBuffer = g19_frame.FrameBuffer()
+    return {'framesPerSecond': _calls_per_second(
+            lambda: g19_qt.qimage_to_frame(img, frameBuffer), 50)}
+
+
+def bench_xplanet_handoff():
+    return xplanet_handoff.measure(rounds=50, frameRounds=5)
+
+
+def bench_reconnect():
+    return reconnect.measure()
+
+
+def bench_lock_contention():
+    return lock_stress.measure(duration=2.0, frameThreads=4,
+            controlThreads=4)
+
+
+BENCHMARKS = [
+        ("convert_image_to_frame", bench_convert_image_to_frame),
+        ("rgb_to_uint16", bench_rgb_to_uint16),
+        ("fill_display_with_color", bench_fill_display_with_color),
+        ("set_display_colorful", bench_set_display_colorful),
+        ("send_frame", bench_send_frame),
+        ("key_decoding", bench_key_decoding),
+        ("input_latency", bench_input_latency),
+        ("control_coalescing", bench_control_coalescing),
+        ("data_store_update", bench_data_store_update),
+        ("xplanet_handoff", bench_xplanet_handoff),
+        ("qimage_to_frame", bench_qimage_to_frame),
+        ("lock_contention", bench_lock_contention),
+        ("reconnect", bench_reconnect)]
+
+
+def _revision():
+    '''Returns the git revision of the working tree, or None.'''
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(__file__)))
+        output = process.communicate()[0]
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    return output.strip()
+
+
+def _flatten(results, prefix=""):
+    '''Returns all numeric values of nested dictionaries by their path.'''
+    values = {}
+    for key, value in results.items():
+        path = prefix + key
+        if isinstance(value, dict):
+            values.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, long, float)) and \
+                not isinstance(value, bool):
+            values[path] = value
+    return values
+
+
+def compare(before, now, out=sys.stdout):
+    '''Prints the ratio now / before of all values found in both reports.'''
+    before = _flatten(before['benchmarks'])
+    now = _flatten(now['benchmarks'])
+    for path in sorted(set(before) & set(now)):
+        if before[path]:
+            ratio = "{0:6.2f}x".format(float(now[path]) / before[path])
+        else:
+            ratio = "      -"
+        out.write("{0:<60} {1:>14.4f} {2:>14.4f} {3}\n".format(
+                path, before[path], now[path], ratio))
+
+
+def run(names=None):
+    '''Runs benchmarks.
+
+    @param names Names of the benchmarks to run (see BENCHMARKS), or None to
+    run all of them.
+    @return Report as dictionary, ready to be written as JSON.
+
+    '''
+    results = {}
+    for name, bench in BENCHMARKS:
+        if names and name not in names:
+            continue
+        sys.stderr.write("running {0}\n".format(name))
+        start = time.time()
+        results[name] = bench()
+        results[name]['benchmarkSeconds'] = time.time() - start
+    return {'revision': _revision(),
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'benchmarks': results}
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(
+            usage="%prog [options] [benchmark ...]",
+            description="Benchmarks: " +
+                    ", ".join(name for name, bench in BENCHMARKS))
+    parser.add_option("-o", "--output", metavar="FILE",
+            help="write the report to FILE instead of stdout")
+    parser.add_option("-c", "--compare", metavar="FILE",
+            help="print the ratios to the report in FILE")
+    options, names = parser.parse_args(argv)
+    unknown = set(names) - set(name for name, bench in BENCHMARKS)
+    if unknown:
+        parser.error("unknown benchmark: " + ", ".join(sorted(unknown)))
+
+    # benchmarked code may print, which must not end up in the report
+    stdout = sys.stdout
+    sys.stdout = sys.stderr
+    try:
+        report = run(names)
+    finally:
+        sys.stdout = stdout
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if options.compare:
+        with open(options.compare) as f:
+            before = json.load(f)
+        compare(before, report, sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+'''Compares the per-frame overhead of handing xplanet images to the daemon.
+
+Run from the repository root:
+
+    python -m benchmarks.xplanet_handoff
+
+"before" is what each frame used to cost: a new temporary file on disk, a
+shell to start the program and removing the file again.  "after" uses an
+ImageHandoff, i.e. one reused file in a RAM-backed directory and no shell.
+Starting a program is measured with true(1); complete frames are only
+measured if xplanet is installed.
+
+'''
+from logitech import g19_frame
+from logitech.applets.xplanet.handoff import (ImageHandoff, ram_directory)
+
+import PIL.Image as Img
+import StringIO
+import distutils.spawn
+import os
+import subprocess
+import tempfile
+import time
+
+
+def _ms_per_call(func, rounds):
+    func()
+    start = time.time()
+    for i in range(rounds):
+        func()
+    return 1000.0 * (time.time() - start) / rounds
+
+
+def _make_bmp():
+    '''Returns an image like xplanet writes it, as BMP data.'''
+    img = Img.frombuffer('RGB', (g19_frame.WIDTH, g19_frame.HEIGHT),
+            os.urandom(g19_frame.WIDTH * g19_frame.HEIGHT * 3), 'raw', 'RGB',
+            0, 1)
+    data = StringIO.StringIO()
+    img.save(data, 'BMP')
+    return data.getvalue()
+
+
+def _write(filename, data):
+    f = open(filename, 'wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
+
+
+def _legacy_file_handoff(bmp):
+    handle, filename = tempfile.mkstemp('.bmp')
+    os.close(handle)
+    try:
+        _write(filename, bmp)
+        return g19_frame.image_to_frame(filename)
+    finally:
+        os.remove(filename)
+
+
+def _legacy_frame():
+    '''Rendering as EarthImageCreator did before ImageHandoff.'''
+    handle, filename = tempfile.mkstemp('.bmp')
+    os.close(handle)
+    try:
+        cmdline = "xplanet -geometry 320x240 -output "
+        cmdline += filename
+        cmdline += " -num_times 1 -latitude 40 -longitude 17"
+        os.system(cmdline)
+        return g19_frame.image_to_frame(filename)
+    finally:
+        os.remove(filename)
+
+
+def measure(rounds=100, frameRounds=10):
+    '''Runs the benchmark.
+
+    @return Dictionary mapping 'spawn', 'file' and 'frame' to dictionaries
+    containing the milliseconds per call before and after ('beforeMs',
+    'afterMs'), and the directories used for the files ('tempDirectory',
+    'ramDirectory').  'frame' is only measured if xplanet is installed.
+
+    '''
+    true = distutils.spawn.find_executable('true')
+    bmp = _make_bmp()
+    handoff = ImageHandoff()
+    try:
+        results = {
+            'spawn': {
+                'beforeMs': _ms_per_call(
+                        lambda: os.system(true + " -geometry 320x240"),
+                        rounds),
+                'afterMs': _ms_per_call(
+                        lambda: subprocess.Popen(
+                                [true, '-geometry', '320x240']).wait(),
+                        rounds)},
+            'file': {
+                'beforeMs': _ms_per_call(
+                        lambda: _legacy_file_handoff(bmp), rounds),
+                'afterMs': _ms_per_call(
+                        lambda: (_write(handoff.get_filename(), bmp),
+                                g19_frame.image_to_frame(
+                                        handoff.get_filename())),
+                        rounds)},
+            'tempDirectory': tempfile.gettempdir(),
+            'ramDirectory': ram_directory()}
+        if distutils.spawn.find_executable('xplanet') is not None:
+            args = ['xplanet', '-geometry', '320x240',
+                    '-output', handoff.get_filename(), '-num_times', '1',
+                    '-latitude', '40', '-longitude', '17']
+            results['frame'] = {
+                    'beforeMs': _ms_per_call(_legacy_frame, frameRounds),
+                    'afterMs': _ms_per_call(lambda: handoff.run(args),
+                            frameRounds)}
+    finally:
+        handoff.close()
+    return results
+
+
+def main(rounds=100, frameRounds=10):
+    results = measure(rounds, frameRounds)
+    print "files in {0} before, {1} after".format(results['tempDirectory'],
+            results['ramDirectory'])
+    for name, description in [("spawn", "starting a program"),
+            ("file", "image file hand-off"), ("frame", "complete frame")]:
+        if name not in results:
+            print "{0:>20}: xplanet not found".format(description)
+            continue
+        result = results[name]
+        print "{0:>20}: before {1:7.3f} ms, after {2:7.3f} ms ({3:.1f}x)" \
+                .format(description, result['beforeMs'], result['afterMs'],
+                        result['beforeMs'] / result['afterMs'])
+
+
+if __name__ == '__main__':
+    main()
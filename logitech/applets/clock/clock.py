@@ -0,0 +1,125 @@
+from logitech import g19_frame
+from logitech.g19_receivers import InputProcessor
+from logitech.runnable import Runnable
+
+import PIL.Image as Img
+import PIL.ImageDraw as ImgDraw
+import threading
+import time
+
+# the default font of PIL is tiny, text is drawn this many times larger
+SCALE = 4
+
+
+def render_time(now):
+    '''Renders the time of day as frame.
+
+    @param now Time as returned by time.time().
+    @return PIL image of display size.
+
+    '''
+    text = time.strftime("%H:%M:%S", time.localtime(now))
+    small = Img.new('RGB', (g19_frame.WIDTH // SCALE,
+            g19_frame.HEIGHT // SCALE))
+    draw = ImgDraw.Draw(small)
+    width, height = draw.textsize(text)
+    draw.text(((small.size[0] - width) // 2, (small.size[1] - height) // 2),
+            text, fill=(255, 255, 255))
+    return small.resize((g19_frame.WIDTH, g19_frame.HEIGHT), Img.NEAREST)
+
+
+class ClockRenderer(Runnable):
+    '''Shows the time of day, once per second.
+
+    While invisible (see set_visible()), the renderer pauses.
+
+    '''
+
+    def __init__(self, lg19):
+        '''Creates a renderer.
+
+        @param lg19 G19 or VirtualScreen to send frames to.
+
+        '''
+        Runnable.__init__(self)
+        self.__lg19 = lg19
+        self.__frame = g19_frame.FrameBuffer()
+        self.__visible = True
+        # signalled when becoming visible or stopped
+        self.__visibleCondition = threading.Condition()
+
+    def execute(self):
+        if not self.__wait_visible():
+            return
+        now = time.time()
+        g19_frame.image_to_frame(render_time(now), self.__frame)
+        self.__lg19.send_frame(self.__frame)
+        # wake up right after the next second started
+        time.sleep(1.0 - now % 1.0)
+
+    def set_visible(self, visible):
+        '''Pauses or resumes rendering.'''
+        self.__visibleCondition.acquire()
+        try:
+            self.__visible = visible
+            self.__visibleCondition.notifyAll()
+        finally:
+            self.__visibleCondition.release()
+
+    def stop(self):
+        Runnable.stop(self)
+        self.__visibleCondition.acquire()
+        try:
+            self.__visibleCondition.notifyAll()
+        finally:
+            self.__visibleCondition.release()
+
+    def __wait_visible(self):
+        '''Waits until visible.
+
+        @return False if stopped while waiting.
+
+        '''
+        self.__visibleCondition.acquire()
+        try:
+            while not self.__visible and not self.is_about_to_stop():
+                # an untimed wait blocks instead of polling
+                self.__visibleCondition.wait()
+            return self.__visible and not self.is_about_to_stop()
+        finally:
+            self.__visibleCondition.release()
+
+
+class Clock(object):
+    '''Applet showing the time of day.'''
+
+    def __init__(self, lg19, screen=None):
+        '''Creates the applet.
+
+        @param lg19 G19 to run on.
+        @param screen VirtualScreen to show the time on.  The clock pauses
+        while the screen is invisible.  If None, frames will be sent to lg19
+        directly.
+
+        '''
+        if screen is None:
+            self.__renderer = ClockRenderer(lg19)
+        else:
+            self.__renderer = ClockRenderer(screen)
+            self.__renderer.set_visible(screen.is_visible())
+            screen.set_visibility_callback(self.__renderer.set_visible)
+        self.__thread = None
+
+    def get_input_processor(self):
+        return InputProcessor()
+
+    def start(self):
+        self.__renderer.start()
+        self.__thread = threading.Thread(target=self.__renderer.run)
+        self.__thread.start()
+
+    def stop(self):
+        self.__renderer.stop()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
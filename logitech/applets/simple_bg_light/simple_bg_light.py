@@ -1,6 +1,9 @@
 from logitech.g19_keys import (Data, Key)
 from logitech.g19_receivers import InputProcessor
 
+# backlight color assumed if none was set yet
+DEFAULT_COLOR = (255, 255, 255)
+
 class SimpleBgLight(object):
     '''Simple color changing.
 
@@ -14,15 +17,15 @@ class SimpleBgLight(object):
         self.__redEnabled = False
         self.__greenEnabled = False
         self.__blueEnabled = False
-        self.__curColor = [255, 255, 255]
 
-    def _clamp_current_color(self):
+    @staticmethod
+    def _clamp_color(color):
         '''Assures that all color components are in [0, 255].'''
         for i in range(3):
-            val = self.__curColor[i]
-            self.__curColor[i] = val if val >= 0 else 0
-            val = self.__curColor[i]
-            self.__curColor[i] = val if val <= 255 else 255
+            val = color[i]
+            color[i] = val if val >= 0 else 0
+            val = color[i]
+            color[i] = val if val <= 255 else 255
 
     def _update_leds(self):
         '''Updates M-leds according to enabled state.'''
@@ -53,7 +56,8 @@ class SimpleBgLight(object):
             self._update_leds()
             processed = True
 
-        oldColor = list(self.__curColor)
+        oldColor = list(self.__lg19.get_bg_color() or DEFAULT_COLOR)
+        curColor = list(oldColor)
         diffVal = 0
         scrollUsed = False
 
@@ -67,18 +71,18 @@ class SimpleBgLight(object):
         atLeastOneColorIsEnabled = False
 
         if self.__redEnabled:
-            self.__curColor[0] += diffVal
+            curColor[0] += diffVal
             atLeastOneColorIsEnabled = True
         if self.__greenEnabled:
-            self.__curColor[1] += diffVal
+            curColor[1] += diffVal
             atLeastOneColorIsEnabled = True
         if self.__blueEnabled:
-            self.__curColor[2] += diffVal
+            curColor[2] += diffVal
             atLeastOneColorIsEnabled = True
 
-        self._clamp_current_color()
+        self._clamp_color(curColor)
         processed = processed or atLeastOneColorIsEnabled and scrollUsed
 
-        if oldColor != self.__curColor:
-            self.__lg19.set_bg_color(*self.__curColor)
+        if oldColor != curColor:
+            self.__lg19.set_bg_color(*curColor)
         return processed
@@ -1,6 +1,9 @@
 from logitech.g19_keys import (Data, Key)
 from logitech.g19_receivers import InputProcessor
 
+# display brightness assumed if none was set yet
+DEFAULT_BRIGHTNESS = 100
+
 class SimpleDisplayBrightness(object):
     '''Simple adjustment of display brightness.
 
@@ -10,7 +13,6 @@ class SimpleDisplayBrightness(object):
 
     def __init__(self, lg19):
         self.__lg19 = lg19
-        self.__curBrightness = 100
 
     @staticmethod
     def _clamp_brightness(val):
@@ -33,10 +35,11 @@ class SimpleDisplayBrightness(object):
             diffVal = -5
             usedInput = True
 
-        oldVal = self.__curBrightness
+        oldVal = self.__lg19.get_display_brightness()
+        if oldVal is None:
+            oldVal = DEFAULT_BRIGHTNESS
         newVal = self._clamp_brightness(oldVal + diffVal)
 
         if oldVal != newVal:
             self.__lg19.set_display_brightness(newVal)
-            self.__curBrightness = newVal
         return usedInput
@@ -0,0 +1,254 @@
+from logitech import g19_frame
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import zlib
+
+# bump when the format of cached files changes
+_FORMAT_VERSION = 1
+
+_SUFFIX = '.frame'
+
+# suffix of the links to the newest frame of each parameters, see
+# FrameCache.load_newest()
+_NEWEST_SUFFIX = '.newest'
+
+
+def _default_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or \
+            os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'g19', 'xplanet')
+
+
+class FrameCache(object):
+    '''Persistent cache of rendered xplanet frames.
+
+    Frames are stored zlib-compressed in the 16bit highcolor format of
+    G19.send_frame(), one file per frame.  A frame is identified by the
+    xplanet parameters it was rendered with and the day and UTC time of day
+    it shows, rounded down to the granularity of the cache.  Frames of other
+    days are not reused, as the terminator changes with the season.
+
+    If the files exceed the size limit, the least recently used ones are
+    removed.  The newest frame stored for each parameters is kept in
+    addition, as a hard link (see load_newest()); those do not count towards
+    the limit.
+
+    This class is thread-safe.
+
+    '''
+
+    def __init__(self, directory=None, maxBytes=64 * 1024 * 1024,
+            granularity=900):
+        '''Creates a cache.
+
+        @param directory Directory to store frames in.  If None,
+        $XDG_CACHE_HOME/g19/xplanet will be used.
+        @param maxBytes Maximum total size of stored frames in bytes.
+        @param granularity Length of the time of day intervals sharing the
+        same frames in seconds.
+
+        '''
+        if directory is None:
+            directory = _default_directory()
+        self.__directory = directory
+        self.__maxBytes = maxBytes
+        self.__granularity = granularity
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__staleHits = 0
+        # file name -> size, None until the directory was scanned
+        self.__sizes = None
+
+    def get_bucket(self, now=None):
+        '''Returns the time interval frames rendered now belong to.
+
+        @param now Time as returned by time.time().  If None, the current time
+        will be used.
+        @return Tuple (bucket, start).  bucket identifies the interval and
+        its day, start is the time as returned by time.time() at which it
+        began.  Frames of the bucket should be rendered for that time.
+
+        '''
+        if now is None:
+            now = time.time()
+        # xplanet takes the time in UTC
+        utc = time.gmtime(now)
+        secondsOfDay = utc.tm_hour * 3600 + utc.tm_min * 60 + utc.tm_sec
+        interval = secondsOfDay // self.__granularity
+        start = int(now) - secondsOfDay + interval * self.__granularity
+        return (utc.tm_year, utc.tm_yday, interval), start
+
+    def get_granularity(self):
+        return self.__granularity
+
+    def get_statistics(self):
+        '''Returns the usage of the cache.
+
+        @return Dictionary containing the number of frames found ('hits') and
+        not found ('misses'), the number of outdated frames found by
+        load_newest() ('staleHits'), and the number and total size in bytes
+        of stored frames ('frames', 'bytes').
+
+        '''
+        self.__lock.acquire()
+        try:
+            try:
+                sizes = self.__get_sizes()
+            except EnvironmentError:
+                sizes = {}
+            return {'hits': self.__hits,
+                    'misses': self.__misses,
+                    'staleHits': self.__staleHits,
+                    'frames': len(sizes),
+                    'bytes': sum(sizes.values())}
+        finally:
+            self.__lock.release()
+
+    def load(self, params, bucket):
+        '''Returns a stored frame.
+
+        @param params Dictionary of the xplanet parameters the frame is
+        rendered with.
+        @param bucket Time interval as returned by get_bucket().
+        @return Frame data as bytearray, or None if the frame is not stored.
+
+        '''
+        data = self.__read(self.__path(params, bucket))
+        self.__lock.acquire()
+        try:
+            if data is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+        finally:
+            self.__lock.release()
+        return data
+
+    def load_newest(self, params):
+        '''Returns the frame stored last for given parameters.
+
+        This is meant as placeholder while the frame of the current bucket is
+        not stored yet, e.g. after the daemon did not run for a while.
+
+        @param params Dictionary of the xplanet parameters the frame is
+        rendered with.
+        @return Frame data as bytearray, or None if no frame of these
+        parameters is stored.
+
+        '''
+        data = self.__read(self.__newest_path(params))
+        if data is not None:
+            self.__lock.acquire()
+            self.__staleHits += 1
+            self.__lock.release()
+        return data
+
+    def store(self, params, bucket, frame):
+        '''Stores a frame, replacing any frame stored for the same key.
+
+        Errors writing the file are reported, but not raised.
+
+        @param params Dictionary of the xplanet parameters the frame was
+        rendered with.
+        @param bucket Time interval as returned by get_bucket().
+        @param frame Frame data as described in G19.send_frame().
+
+        '''
+        if isinstance(frame, list):
+            frame = bytearray(val & 0xff for val in frame)
+        data = zlib.compress(str(frame), 1)
+        path = self.__path(params, bucket)
+        self.__lock.acquire()
+        try:
+            sizes = self.__get_sizes()
+            handle, tmpPath = tempfile.mkstemp(_SUFFIX + '.tmp',
+                    dir=self.__directory)
+            try:
+                os.write(handle, data)
+            finally:
+                os.close(handle)
+            os.rename(tmpPath, path)
+            sizes[os.path.basename(path)] = len(data)
+            # the name of the temporary file is free again
+            os.link(path, tmpPath)
+            os.rename(tmpPath, self.__newest_path(params))
+            self.__evict(sizes)
+        except EnvironmentError, e:
+            print "cannot store xplanet frame: {0}".format(e)
+        finally:
+            self.__lock.release()
+
+    def __evict(self, sizes):
+        '''Removes least recently used files until sizes fit.'''
+        total = sum(sizes.values())
+        if total <= self.__maxBytes:
+            return
+        files = []
+        for name in sizes:
+            try:
+                mtime = os.path.getmtime(os.path.join(self.__directory, name))
+            except EnvironmentError:
+                mtime = 0
+            files.append((mtime, name))
+        files.sort()
+        for mtime, name in files:
+            if total <= self.__maxBytes:
+                break
+            try:
+                os.remove(os.path.join(self.__directory, name))
+            except EnvironmentError:
+                pass
+            total -= sizes.pop(name)
+
+    def __get_sizes(self):
+        '''Returns the sizes of all stored files, creating the directory.
+
+        Must be called with the lock held.
+
+        '''
+        if self.__sizes is None:
+            if not os.path.isdir(self.__directory):
+                os.makedirs(self.__directory)
+            sizes = {}
+            for name in os.listdir(self.__directory):
+                if not name.endswith(_SUFFIX):
+                    continue
+                try:
+                    sizes[name] = os.path.getsize(
+                            os.path.join(self.__directory, name))
+                except EnvironmentError:
+                    pass
+            self.__sizes = sizes
+        return self.__sizes
+
+    def __newest_path(self, params):
+        key = repr((_FORMAT_VERSION, sorted(params.items())))
+        return os.path.join(self.__directory,
+                hashlib.sha1(key).hexdigest() + _NEWEST_SUFFIX)
+
+    def __path(self, params, bucket):
+        key = repr((_FORMAT_VERSION, sorted(params.items()),
+                self.__granularity, bucket))
+        return os.path.join(self.__directory,
+                hashlib.sha1(key).hexdigest() + _SUFFIX)
+
+    def __read(self, path):
+        '''Returns the frame stored in a file, or None.'''
+        try:
+            f = open(path, 'rb')
+            try:
+                data = zlib.decompress(f.read())
+            finally:
+                f.close()
+            # mark as recently used
+            os.utime(path, None)
+        except (EnvironmentError, zlib.error):
+            return None
+        if len(data) != g19_frame.FRAME_SIZE:
+            return None
+        return bytearray(data)
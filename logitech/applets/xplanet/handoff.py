@@ -0,0 +1,106 @@
+from logitech import g19_frame
+
+import os
+import subprocess
+import tempfile
+import threading
+
+# directories backed by RAM, in order of preference
+RAM_DIRECTORIES = ['/dev/shm', '/run/shm']
+
+
+def ram_directory():
+    '''Returns a directory for short-lived files which does not hit the disk.
+
+    @return The first writable one of RAM_DIRECTORIES, or the default
+    directory for temporary files if none is available.
+
+    '''
+    for directory in RAM_DIRECTORIES:
+        if os.path.isdir(directory) and os.access(directory, os.W_OK):
+            return directory
+    return tempfile.gettempdir()
+
+
+class ImageHandoff(object):
+    '''File through which a program passes images to the frame pipeline.
+
+    The file lives in a RAM-backed directory (see ram_directory()) and is
+    reused for every image, so each image costs neither disk I/O nor
+    creating a file.  Programs are started without a shell.
+
+    Each process or thread producing images needs its own instance; only
+    abort() may be called from other threads.
+
+    '''
+
+    def __init__(self, suffix='.bmp', directory=None):
+        '''Creates the file for handing off images.
+
+        @param suffix File name suffix, which tells programs like xplanet the
+        image format to write.
+        @param directory Directory for the file.  If None, ram_directory()
+        will be used.
+
+        '''
+        if directory is None:
+            directory = ram_directory()
+        handle, self.__filename = tempfile.mkstemp(suffix, 'g19-',
+                directory)
+        os.close(handle)
+        # guards the program being run and the aborted flag
+        self.__mutex = threading.Lock()
+        self.__process = None
+        self.__aborted = False
+
+    def abort(self):
+        '''Terminates the program being run and keeps run() from starting
+        others.  Thread-safe.
+
+        '''
+        self.__mutex.acquire()
+        try:
+            self.__aborted = True
+            if self.__process is not None and \
+                    self.__process.returncode is None:
+                self.__process.terminate()
+        finally:
+            self.__mutex.release()
+
+    def close(self):
+        '''Removes the file.'''
+        if self.__filename is not None:
+            try:
+                os.remove(self.__filename)
+            except OSError:
+                pass
+            self.__filename = None
+
+    def get_filename(self):
+        '''Returns the name of the file images are to be written to.'''
+        return self.__filename
+
+    def run(self, args):
+        '''Runs a program writing an image and converts the image to a frame.
+
+        @param args Program and its arguments.  The program is expected to
+        write its image to get_filename().
+        @return Frame data as bytearray, see g19_frame.image_to_frame().
+        @raise OSError if the program failed or was aborted.
+
+        '''
+        self.__mutex.acquire()
+        try:
+            if self.__aborted:
+                raise OSError("{0} aborted".format(args[0]))
+            process = self.__process = subprocess.Popen(args)
+        finally:
+            self.__mutex.release()
+        status = process.wait()
+        self.__mutex.acquire()
+        self.__process = None
+        self.__mutex.release()
+        if status != 0:
+            raise OSError("{0} failed with exit status {1}".format(args[0],
+                    status))
+        return g19_frame.image_to_frame(self.__filename)
@@ -1,158 +1,614 @@
+from logitech import g19_frame
+from logitech.applets.xplanet.frame_cache import FrameCache
+from logitech.applets.xplanet.handoff import (ImageHandoff, ram_directory)
+from logitech.frame_pacer import (FramePacer, monotonic)
 from logitech.g19 import *
 from logitech.g19_keys import Key
 from logitech.g19_receivers import *
 from logitech.runnable import Runnable
 
+import collections
 import multiprocessing
+import multiprocessing.util
 import os
+import select
+import shutil
 import tempfile
 import threading
 import time
 
 
-class EarthImageCreator(Runnable):
-    '''Thread for calling xplanet for specific angles.'''
+# angle steps in degrees of the successively rendered resolutions
+REFINEMENT_STEPS = [30, 10, 5, 1]
 
-    def __init__(self, lg19, angleStart, angleStop, slot, dataStore):
-        '''Creates images for angles [angleStart, angleStop) and stores a the
-        list of frames via dataStore.store(slot, frames).
+# additional frames in the arena of DataStore, for replacing frames; one more
+# than frames can be in flight (one per XplanetRenderer), so a free one is
+# always left
+SPARE_FRAMES = 2
 
-        After completion of each frame, dataStore.signal_frame_done() will be
-        called.
+# time recorded for outdated frames taken from the cache, whose actual time
+# is unknown; older than any rendered time, so they are refreshed first
+STALE_TIME = 0
 
-        '''
-        Runnable.__init__(self)
-        self.__angleStart = angleStart
-        self.__angleStop = angleStop
-        self.__dataStore = dataStore
-        self.__lg19 = lg19
-        self.__slot = slot
+# image hand-off of a pool worker and the event telling it to skip renders,
+# see _init_worker()
+_handoff = None
+_skipRenders = None
 
-    def run(self):
-        frames = []
-        try:
-            handle, filename = tempfile.mkstemp('.bmp')
-            os.close(handle)
-            
-            for i in range(self.__angleStart, self.__angleStop):
-                if self.is_about_to_stop():
-                    break
-                cmdline = "xplanet -geometry 320x240 -output "
-                cmdline += filename
-                cmdline += " -num_times 1 -latitude 40 -longitude "
-                cmdline += str(i)
-                os.system(cmdline)
-                frames.append( self.__lg19.convert_image_to_frame(filename) );
-                self.__dataStore.signal_frame_done()
-        finally:
-            os.remove(filename)
-        self.__dataStore.store(self.__slot, frames)
+
+def _make_params(angle):
+    '''Returns the xplanet parameters of the frame of given angle.'''
+    return {'geometry': '320x240', 'latitude': 40, 'longitude': angle}
+
+
+def _refinement_level(angle):
+    '''Returns the index of the first resolution containing given angle.'''
+    for level, step in enumerate(REFINEMENT_STEPS):
+        if angle % step == 0:
+            return level
+    return len(REFINEMENT_STEPS)
+
+
+def _hold_frames(frames):
+    '''Fills the gaps of a sequence of frames.
+
+    A missing frame is replaced by the one before it, the first ones by the
+    last frame of the sequence.
+
+    @param frames List of frames (or their angles), None for missing ones.
+    @return List of frames without gaps, or None if no frame is available.
+
+    '''
+    last = None
+    for frame in reversed(frames):
+        if frame is not None:
+            last = frame
+            break
+    if last is None:
+        return None
+    result = []
+    for frame in frames:
+        if frame is not None:
+            last = frame
+        result.append(last)
+    return result
+
+
+def _init_worker(directory, skipRenders):
+    '''Gives a pool worker its own image hand-off file in directory.
+
+    Its file is removed along with directory.  Once the multiprocessing
+    Event skipRenders is set, the xplanet process of the worker is
+    terminated and its remaining tasks are skipped (see
+    DataStore.abort_update()).
+
+    '''
+    global _handoff, _skipRenders
+    _handoff = ImageHandoff(directory=directory)
+    _skipRenders = skipRenders
+    multiprocessing.util.Finalize(None, _handoff.close, exitpriority=0)
+    # waits without polling; the thread ends with the worker
+    watchdog = threading.Thread(target=_abort_on_skip,
+            args=(_handoff, skipRenders))
+    watchdog.daemon = True
+    watchdog.start()
+
+
+def _abort_on_skip(handoff, skipRenders):
+    '''Aborts handoff once skipRenders is set.  Run by a pool worker.'''
+    skipRenders.wait()
+    handoff.abort()
+
+
+def _render_frame(angle, params, date):
+    '''Calls xplanet and converts its image.
+
+    Pool workers use their own image hand-off, other callers a temporary one.
+
+    @param angle Index of the frame.
+    @param params Dictionary of xplanet parameters, see DataStore.
+    @param date Time to render as xplanet -date argument, or None to render
+    the current time.
+    @return Tuple (angle, frame, error).  frame is the frame data as str, or
+    None if rendering failed as described by error.  Both are None if the
+    render was skipped.
+
+    '''
+    if _skipRenders is not None and _skipRenders.is_set():
+        return angle, None, None
+    handoff = _handoff
+    if handoff is None:
+        handoff = ImageHandoff()
+    try:
+        args = ['xplanet', '-geometry', params['geometry'],
+                '-output', handoff.get_filename(), '-num_times', '1',
+                '-latitude', str(params['latitude']),
+                '-longitude', str(params['longitude'])]
+        if date is not None:
+            args += ['-date', date]
+        return angle, str(handoff.run(args)), None
+    except Exception, e:
+        if _skipRenders is not None and _skipRenders.is_set():
+            return angle, None, None
+        return angle, None, "{0}: {1}".format(type(e).__name__, e)
+    finally:
+        if handoff is not _handoff:
+            handoff.close()
 
 
 class DataStore(object):
-    '''Maintains all xplanet generated frames.'''
+    '''Maintains all xplanet generated frames.
+
+    Frames are rendered by a pool of processes, each taking the next missing
+    angle when done with one.  Every frame becomes visible via get_data() as
+    soon as it is finished.  Angles are rendered coarse to fine (see
+    REFINEMENT_STEPS), so a complete rotation at low resolution is available
+    early.
+
+    All frames are kept in one FrameArena and handed out as memoryviews of
+    it.  A frame replacing an available one is written to a spare slot of the
+    arena first and then swapped in.  Slots pinned by pin_frame() are not
+    reused until released, so frames being sent are never changed.
+
+    After an update, refresh_oldest() renders single frames again to follow
+    the movement of the day/night terminator (see XplanetRefresher).  Frames
+    the cache has no current version of are not rendered by the update if
+    it has an outdated one (see FrameCache.load_newest()); that is shown
+    instead until refreshed, so the globe appears right away even after the
+    daemon did not run for a while.
+
+    '''
+
+    def __init__(self, cache=None, numProcesses=None, useMmap=False):
+        '''Creates a data store.
+
+        @param cache FrameCache to reuse frames rendered before.  If None,
+        all frames will be rendered on every update.
+        @param numProcesses Number of processes rendering frames.  If None,
+        one per CPU will be used.
+        @param useMmap Whether to keep the frames in an anonymous memory map
+        (see FrameArena).
 
-    def __init__(self, lg19):
-        self.__allFrames = []
-        self.__creators = []
-        self.__numThreads = multiprocessing.cpu_count()
-        self.__lg19 = lg19
-        self.__data = [[]] * self.__numThreads
+        '''
+        if numProcesses is None:
+            numProcesses = multiprocessing.cpu_count()
+        self.__cache = cache
+        self.__numProcesses = numProcesses
         self.__lock = threading.Lock()
+        self.__updateLock = threading.Lock()
+        self.__arena = g19_frame.FrameArena(360 + SPARE_FRAMES, useMmap)
+        self.__views = [self.__arena.get_frame(angle) for angle in range(360)]
+        # arena slot of the frame of each angle, and unused slots; freed slots
+        # are reused last
+        self.__slots = range(360)
+        self.__spareSlots = collections.deque(range(360, 360 + SPARE_FRAMES))
+        # number of pins of each slot, see pin_frame()
+        self.__pins = [0] * (360 + SPARE_FRAMES)
+        # signalled when a slot is released
+        self.__released = threading.Condition(self.__lock)
+        # whether the frame of each angle was calculated
+        self.__available = [False] * 360
+        # time shown by the frame of each angle
+        self.__renderedAt = [None] * 360
         self.__framesDone = 0
+        self.__aborted = False
+        self.__skipRenders = multiprocessing.Event()
 
     def abort_update(self):
+        '''Aborts a running update.
+
+        Running xplanet processes are terminated and the remaining frames
+        are skipped; frames finished so far are kept.  The pool workers
+        themselves are not killed, as a worker killed while passing on a
+        result would deadlock the pool.
+
+        '''
+        self.__lock.acquire()
+        try:
+            self.__aborted = True
+            self.__skipRenders.set()
+        finally:
+            self.__lock.release()
+
+    def get_frames(self):
+        '''Returns the frames of all angles.
+
+        @return List of 360 frames, the frame of angle i at index i.  Frames
+        not calculated yet are None.
+
+        '''
         self.__lock.acquire()
-        for creator in self.__creators:
-            creator.stop()
-        self.__lock.release()
+        try:
+            return [view if available else None
+                    for view, available in zip(self.__views, self.__available)]
+        finally:
+            self.__lock.release()
 
     def get_data(self):
         '''Returns all currently available data.
 
-        @return List of all frames.  If no frames are calculated, an empty list
-        will be returned.
+        @return List of all frames, ordered by angle.  If no frames are
+        calculated, an empty list will be returned.
 
         '''
         self.__lock.acquire()
-        frames = self.__allFrames
-        self.__lock.release()
-        return frames
+        try:
+            return [view for view, available in
+                    zip(self.__views, self.__available) if available]
+        finally:
+            self.__lock.release()
 
-    def signal_frame_done(self):
+    def pin_frame(self, angle):
+        '''Returns the frame of an angle for sending it.
+
+        The frame is not changed until released via release_frame(), even if
+        it gets replaced meanwhile.
+
+        @return Pair of the frame and the slot to pass to release_frame(), or
+        None if the frame is not calculated yet.
+
+        '''
         self.__lock.acquire()
-        self.__framesDone += 1
-        print "frames done: {0}".format(self.__framesDone)
-        self.__lock.release()
+        try:
+            if not self.__available[angle]:
+                return None
+            slot = self.__slots[angle]
+            self.__pins[slot] += 1
+            return self.__views[angle], slot
+        finally:
+            self.__lock.release()
 
-    def update(self):
-        '''Regenerates all data.'''
+    def release_frame(self, slot):
+        '''Releases a frame pinned by pin_frame().'''
         self.__lock.acquire()
-        self.__framesDone = 0
-        self.__data = [[]] * self.__numThreads
-        self.__lock.release()
-        threads = []
-
-        for i in range(self.__numThreads):
-            perCpu = 360 / self.__numThreads
-            angleStart = i * perCpu
-            if i == self.__numThreads - 1:
-                angleStop = 360
-            else:
-                angleStop = angleStart + perCpu
-            c = EarthImageCreator(self.__lg19, angleStart, angleStop, i, self)
+        try:
+            self.__pins[slot] -= 1
+            self.__released.notifyAll()
+        finally:
+            self.__lock.release()
+
+    def refresh_oldest(self):
+        '''Renders the frame showing the oldest time again.
+
+        Nothing is done while an update is running, or if all frames show the
+        current time bucket of the cache.
+
+        @return Angle of the refreshed frame, or None.
+
+        '''
+        if not self.__updateLock.acquire(False):
+            return None
+        try:
             self.__lock.acquire()
-            self.__creators.append(c)
+            try:
+                candidates = [(renderedAt, angle) for angle, renderedAt in
+                        enumerate(self.__renderedAt) if renderedAt is not None]
+            finally:
+                self.__lock.release()
+            if not candidates:
+                return None
+            renderedAt, angle = min(candidates)
+
+            bucket, date, renderTime = self.__get_render_time()
+            if bucket is not None and renderedAt == renderTime:
+                return None
+            params = _make_params(angle)
+            frame = None
+            if self.__cache is not None:
+                frame = self.__cache.load(params, bucket[0])
+            if frame is None:
+                angle, frame, error = _render_frame(angle, params, date)
+                if error is not None:
+                    print "cannot render xplanet frame {0}: {1}".format(angle,
+                            error)
+                    return None
+                if self.__cache is not None:
+                    self.__cache.store(params, bucket[0], frame)
+            self.__lock.acquire()
+            try:
+                self.__set_frame(angle, frame, renderTime)
+            finally:
+                self.__lock.release()
+            return angle
+        finally:
+            self.__updateLock.release()
+
+    def update(self):
+        '''Regenerates all data.
+
+        Frames of the previous update stay visible until replaced.
+
+        '''
+        self.__updateLock.acquire()
+        try:
+            self.__update()
+        finally:
+            self.__updateLock.release()
+
+    def __frame_rendered(self, result, params, bucket, renderTime):
+        '''Publishes a frame.  Called by the result thread of the pool.'''
+        angle, frame, error = result
+        if error is not None:
+            print "cannot render xplanet frame {0}: {1}".format(angle, error)
+        elif frame is not None and self.__cache is not None:
+            self.__cache.store(params, bucket[0], frame)
+        self.__lock.acquire()
+        try:
+            if frame is not None:
+                self.__set_frame(angle, frame, renderTime)
+            self.__framesDone += 1
+            print "frames done: {0}".format(self.__framesDone)
+        finally:
             self.__lock.release()
-            c.start()
-            t = threading.Thread(target=c.run)
-            threads.append(t)
-            t.start()
 
-        for t in threads:
-            t.join()
+    def __get_render_time(self):
+        '''Returns the time bucket, xplanet -date argument and time to render.
+
+        Without cache, the current time is rendered and the bucket and date
+        are None.
+
+        '''
+        if self.__cache is None:
+            return None, None, time.time()
+        bucket = self.__cache.get_bucket()
+        # xplanet reads -date as GMT
+        date = time.strftime("%Y%m%d.%H%M%S", time.gmtime(bucket[1]))
+        return bucket, date, bucket[1]
+
+    def __set_frame(self, angle, frame, renderedAt):
+        '''Stores a frame.  Must be called with the lock held.'''
+        if self.__available[angle]:
+            # do not change the frame in place, it may be being displayed
+            slot = self.__take_spare_slot()
+            self.__arena.set_frame(slot, frame)
+            self.__spareSlots.append(self.__slots[angle])
+            self.__slots[angle] = slot
+            self.__views[angle] = self.__arena.get_frame(slot)
+        else:
+            self.__arena.set_frame(self.__slots[angle], frame)
+        self.__available[angle] = True
+        self.__renderedAt[angle] = renderedAt
+
+    def __take_spare_slot(self):
+        '''Removes a spare slot not pinned from the spares and returns it.
+
+        Waits for a release if all are pinned.  Must be called with the lock
+        held.
 
+        '''
+        while True:
+            for slot in self.__spareSlots:
+                if not self.__pins[slot]:
+                    self.__spareSlots.remove(slot)
+                    return slot
+            self.__released.wait()
+
+    def __update(self):
         self.__lock.acquire()
-        self.__creators = []
-        self.__allFrames = []
-        for frame in self.__data:
-            self.__allFrames += frame
-        self.__lock.release()
+        try:
+            self.__framesDone = 0
+            self.__aborted = False
+            self.__skipRenders.clear()
+        finally:
+            self.__lock.release()
+
+        bucket, date, renderTime = self.__get_render_time()
+        missing = []
+        for angle in range(360):
+            params = _make_params(angle)
+            frame = None
+            frameTime = renderTime
+            if self.__cache is not None:
+                frame = self.__cache.load(params, bucket[0])
+                if frame is None:
+                    # an outdated frame is shown until the refresher
+                    # replaces it, oldest first
+                    frame = self.__cache.load_newest(params)
+                    frameTime = STALE_TIME
+            if frame is None:
+                missing.append((angle, params))
+            else:
+                self.__lock.acquire()
+                self.__set_frame(angle, frame, frameTime)
+                self.__lock.release()
 
-    def store(self, slot, frames):
         self.__lock.acquire()
-        print "committing {0}".format(slot)
-        self.__data[slot] = frames
-        self.__lock.release()
+        try:
+            if self.__aborted or not missing:
+                return
+        finally:
+            self.__lock.release()
+
+        directory = tempfile.mkdtemp(prefix='g19-xplanet-',
+                dir=ram_directory())
+        try:
+            pool = multiprocessing.Pool(self.__numProcesses, _init_worker,
+                    (directory, self.__skipRenders))
+            missing.sort(key=lambda item: _refinement_level(item[0]))
+            for angle, params in missing:
+                pool.apply_async(_render_frame, (angle, params, date),
+                        callback=lambda result, params=params:
+                                self.__frame_rendered(result, params, bucket,
+                                        renderTime))
+            pool.close()
+            pool.join()
+        finally:
+            shutil.rmtree(directory, True)
 
 
 class XplanetRenderer(Runnable):
-    '''Renderer which renderes current data from DataStore.'''
+    '''Renderer which renderes current data from DataStore.
+
+    While invisible (see set_visible()), the renderer pauses.
+
+    '''
 
     def __init__(self, lg19, dataStore):
+        '''Creates a renderer.
+
+        @param lg19 G19 or VirtualScreen to send frames to.
+        @param dataStore DataStore to take frames from.
+
+        '''
         Runnable.__init__(self)
         self.__dataStore = dataStore
         self.__fps = 25
-        self.__lastTime = time.clock()
         self.__lg19 = lg19
+        self.__pacer = FramePacer(self.__fps)
+        self.__visible = True
+        # signalled when becoming visible or stopped
+        self.__visibleCondition = threading.Condition()
 
     def execute(self):
-        frames = reversed(self.__dataStore.get_data())
-        if not frames:
+        if not self.__wait_visible():
+            return
+        if self.__get_angles() is None:
             time.sleep(1)
+            return
         counter = 0
-        for frame in frames:
+        i = 0
+        while i < 360 and self.__visible:
             counter += 1
             if counter > self.__fps:
                 counter = 0
                 if self.is_about_to_stop():
                     break
-            now = time.clock()
-            diff = self.__lastTime - now + (1.0 / self.__fps)
-            if diff > 0:
-                time.sleep(diff)
-            self.__lastTime = time.clock()
+            # dropping frames keeps the rotation speed if sending is slow
+            i += self.__pacer.wait()
+            # frames finished or replaced meanwhile are picked up right away
+            angles = self.__get_angles()
+            if i < len(angles):
+                self.__send(angles[i])
+            i += 1
+
+    def get_statistics(self):
+        '''Returns the frame timing since the last start.
+
+        @return Statistics as described for FramePacer.get_statistics().
+
+        '''
+        return self.__pacer.get_statistics()
+
+    def set_visible(self, visible):
+        '''Pauses or resumes rendering.'''
+        self.__visibleCondition.acquire()
+        try:
+            self.__visible = visible
+            self.__visibleCondition.notifyAll()
+        finally:
+            self.__visibleCondition.release()
+
+    def start(self):
+        self.__pacer.reset()
+        Runnable.start(self)
+
+    def stop(self):
+        Runnable.stop(self)
+        self.__visibleCondition.acquire()
+        try:
+            self.__visibleCondition.notifyAll()
+        finally:
+            self.__visibleCondition.release()
+
+    def __get_angles(self):
+        '''Returns the angles of the frames to play, in playback order.
+
+        Missing angles show the previous frame, so the globe keeps its speed
+        while it is still being rendered.
+
+        '''
+        angles = [None if frame is None else angle
+                for angle, frame in enumerate(self.__dataStore.get_frames())]
+        angles.reverse()
+        return _hold_frames(angles)
+
+    def __send(self, angle):
+        '''Sends the frame of an angle, keeping it pinned while in flight.'''
+        pinned = self.__dataStore.pin_frame(angle)
+        if pinned is None:
+            return
+        frame, slot = pinned
+        try:
             self.__lg19.send_frame(frame)
+        finally:
+            self.__dataStore.release_frame(slot)
+
+    def __wait_visible(self):
+        '''Waits until visible.
+
+        @return False if stopped while waiting.
+
+        '''
+        self.__visibleCondition.acquire()
+        try:
+            if self.__visible:
+                return True
+            while not self.__visible and not self.is_about_to_stop():
+                # an untimed wait blocks instead of polling
+                self.__visibleCondition.wait()
+            # the schedule does not account for the pause
+            self.__pacer.reset()
+            return self.__visible
+        finally:
+            self.__visibleCondition.release()
+
+
+class XplanetRefresher(Runnable):
+    '''Keeps the frames of a DataStore up to date.
+
+    Renders single frames at a constant rate, the one showing the oldest
+    time first, so the CPU load stays low and constant.  The rate is chosen
+    so all frames are rendered again within the refresh period, e.g. the
+    granularity of the FrameCache.
+
+    While invisible (see set_visible()), the refresher pauses.
+
+    '''
+
+    def __init__(self, dataStore, period):
+        '''Creates a refresher.
+
+        @param dataStore DataStore to refresh.
+        @param period Time in seconds in which every frame is to be rendered
+        again.
+
+        '''
+        Runnable.__init__(self)
+        self.__dataStore = dataStore
+        self.__interval = float(period) / len(dataStore.get_frames())
+        self.__nextRefresh = None
+        self.__visible = True
+        # stop() and set_visible() wake up execute() via this pipe; timed
+        # waits on Python locks poll
+        self.__wakeFd, self.__wakeupFd = os.pipe()
+
+    def execute(self):
+        now = monotonic()
+        if self.__nextRefresh is None:
+            self.__nextRefresh = now + self.__interval
+        timeout = None
+        if self.__visible:
+            timeout = max(0.0, self.__nextRefresh - now)
+        if select.select([self.__wakeFd], [], [], timeout)[0]:
+            os.read(self.__wakeFd, 1)
+            return
+        if not self.is_about_to_stop():
+            # the time rendering takes counts towards the interval
+            self.__nextRefresh = monotonic() + self.__interval
+            self.__dataStore.refresh_oldest()
+
+    def set_visible(self, visible):
+        '''Pauses or resumes refreshing.'''
+        self.__visible = visible
+        os.write(self.__wakeupFd, 'x')
+
+    def start(self):
+        self.__nextRefresh = None
+        Runnable.start(self)
+
+    def stop(self):
+        Runnable.stop(self)
+        os.write(self.__wakeupFd, 'x')
 
 
 class XplanetInputProcessor(InputProcessor):
@@ -173,25 +629,67 @@ class XplanetInputProcessor(InputProcessor):
 
 class Xplanet(object):
 
-    def __init__(self, lg19):
-        self.__dataStore = DataStore(lg19)
+    def __init__(self, lg19, screen=None):
+        '''Creates the applet.
+
+        @param lg19 G19 to run on.
+        @param screen VirtualScreen to show the globe on.  The globe stops
+        rotating and its frames are not refreshed while the screen is
+        invisible.  If None, frames will be sent to lg19 directly.
+
+        '''
+        cache = FrameCache()
+        self.__dataStore = DataStore(cache)
         self.__lg19 = lg19
-        self.__renderer = XplanetRenderer(lg19, self.__dataStore)
+        self.__refresher = XplanetRefresher(self.__dataStore,
+                cache.get_granularity())
+        if screen is None:
+            self.__renderer = XplanetRenderer(lg19, self.__dataStore)
+        else:
+            self.__renderer = XplanetRenderer(screen, self.__dataStore)
+            self.__set_visible(screen.is_visible())
+            screen.set_visibility_callback(self.__set_visible)
         self.__inputProcessor = XplanetInputProcessor(self)
+        # guards the threads below, empty while stopped
+        self.__mutex = threading.Lock()
+        self.__threads = []
 
     def get_input_processor(self):
         return self.__inputProcessor
 
     def start(self):
-        t = threading.Thread(target=self.__dataStore.update)
-        t.start()
-        t = threading.Thread(target=self.__renderer.run)
-        self.__renderer.start()
-        t.start()
+        '''Starts updating and showing the globe, unless already running.'''
+        self.__mutex.acquire()
+        try:
+            if self.__threads:
+                return
+            self.__renderer.start()
+            self.__refresher.start()
+            self.__threads = [
+                    threading.Thread(target=self.__dataStore.update),
+                    threading.Thread(target=self.__renderer.run),
+                    threading.Thread(target=self.__refresher.run)]
+            for t in self.__threads:
+                t.start()
+        finally:
+            self.__mutex.release()
 
     def stop(self):
-        self.__renderer.stop()
-        self.__dataStore.abort_update()
+        '''Stops the globe and waits until its threads have finished.'''
+        self.__mutex.acquire()
+        try:
+            self.__refresher.stop()
+            self.__renderer.stop()
+            self.__dataStore.abort_update()
+            for t in self.__threads:
+                t.join()
+            self.__threads = []
+        finally:
+            self.__mutex.release()
+
+    def __set_visible(self, visible):
+        self.__renderer.set_visible(visible)
+        self.__refresher.set_visible(visible)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,170 @@
+import ctypes
+import threading
+import time
+
+# policies for frames which are late by more than one frame period
+DROP = 0
+CATCH_UP = 1
+
+_CLOCK_MONOTONIC = 1
+
+
+class _Timespec(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def _find_clock_gettime():
+    for name in ['librt.so.1', 'libc.so.6']:
+        try:
+            return ctypes.CDLL(name).clock_gettime
+        except (OSError, AttributeError):
+            pass
+    return None
+
+
+def _make_monotonic():
+    '''Returns the best monotonic clock function available.
+
+    time.monotonic() does not exist in Python 2, so clock_gettime() is called
+    directly where possible.  If neither is available, time.time() is used.
+
+    '''
+    if hasattr(time, 'monotonic'):
+        return time.monotonic
+    clockGettime = _find_clock_gettime()
+    if clockGettime is None:
+        return time.time
+    lock = threading.Lock()
+    timespec = _Timespec()
+    def monotonic():
+        lock.acquire()
+        try:
+            if clockGettime(_CLOCK_MONOTONIC, ctypes.byref(timespec)) != 0:
+                raise OSError("clock_gettime failed")
+            return timespec.tv_sec + timespec.tv_nsec * 1e-9
+        finally:
+            lock.release()
+    return monotonic
+
+
+# Seconds since some unspecified point in time, not affected by changes of
+# the system time and, unlike time.clock(), advancing while the process
+# sleeps.
+monotonic = _make_monotonic()
+
+
+class FramePacer(object):
+    '''Paces an animation to a constant frame rate.
+
+    Frames are scheduled at fixed points in time (start + n / fps), so delays
+    of single frames do not accumulate.  Frames which are late by more than a
+    frame period are either dropped (DROP), keeping the animation in sync
+    with the clock, or shown without waiting until the schedule is met again
+    (CATCH_UP).  If the animation fell behind by more than maxLag seconds,
+    it restarts its schedule from the current time in either case.
+
+    Usage:
+
+        >>> pacer = FramePacer(25)
+        >>> i = 0
+        >>> while i < len(frames):
+        ...     i += pacer.wait()
+        ...     if i < len(frames):
+        ...         show(frames[i])
+        ...     i += 1
+
+    This class is NOT thread-safe.
+
+    '''
+
+    def __init__(self, fps, policy=DROP, maxLag=1.0, clock=monotonic):
+        '''Creates a pacer.
+
+        @param fps Frames per second.
+        @param policy DROP or CATCH_UP.
+        @param maxLag Maximum time in seconds the animation may lag behind
+        before its schedule is restarted.
+        @param clock Function returning the current time in seconds.
+
+        '''
+        self.__period = 1.0 / fps
+        self.__policy = policy
+        self.__maxLag = maxLag
+        self.__clock = clock
+        self.reset()
+
+    def get_statistics(self):
+        '''Returns the frame timing since the last reset.
+
+        @return Dictionary containing the number of frames shown ('frames')
+        and dropped ('dropped'), the frame rate achieved ('fps'), the mean
+        deviation of frame intervals from their scheduled length in seconds
+        ('jitter'), the maximum time a frame was late in seconds
+        ('maxLateness') and the number of schedule restarts ('resyncs').
+
+        '''
+        elapsed = 0.0
+        if self.__frames > 1:
+            elapsed = self.__lastShown - self.__firstShown
+        return {'frames': self.__frames,
+                'dropped': self.__dropped,
+                'fps': (self.__frames - 1) / elapsed if elapsed else 0.0,
+                'jitter': self.__jitterSum / (self.__frames - 1)
+                        if self.__frames > 1 else 0.0,
+                'maxLateness': self.__maxLateness,
+                'resyncs': self.__resyncs}
+
+    def reset(self):
+        '''Restarts the schedule with the next frame and clears statistics.
+
+        Call this after pausing the animation.
+
+        '''
+        self.__deadline = None
+        self.__frames = 0
+        self.__dropped = 0
+        self.__resyncs = 0
+        self.__firstShown = None
+        self.__lastShown = None
+        self.__lastDeadline = None
+        self.__jitterSum = 0.0
+        self.__maxLateness = 0.0
+
+    def wait(self):
+        '''Waits until the next frame is due.
+
+        @return Number of frames to drop before showing the next one.  Always
+        0 for policy CATCH_UP.
+
+        '''
+        now = self.__clock()
+        if self.__deadline is None:
+            self.__deadline = now
+        dropped = 0
+        lateness = now - self.__deadline
+        if lateness > self.__maxLag:
+            self.__resyncs += 1
+            self.__deadline = now
+        elif lateness < 0:
+            time.sleep(-lateness)
+            now = self.__clock()
+        elif lateness >= self.__period and self.__policy == DROP:
+            dropped = int(lateness / self.__period)
+            self.__deadline += dropped * self.__period
+            self.__dropped += dropped
+        self.__maxLateness = max(self.__maxLateness, now - self.__deadline)
+        self.__record_frame(now, self.__deadline)
+        self.__deadline += self.__period
+        return dropped
+
+    def __record_frame(self, now, deadline):
+        if self.__lastShown is None:
+            self.__firstShown = now
+        else:
+            # deviation from the interval scheduled, which includes dropped
+            # frames
+            self.__jitterSum += abs((now - self.__lastShown) -
+                    (deadline - self.__lastDeadline))
+        self.__lastShown = now
+        self.__lastDeadline = deadline
+        self.__frames += 1
@@ -1,24 +1,144 @@
+from frame_pacer import monotonic
+from g19_io import G19IoScheduler
 from g19_receivers import G19Receiver
+import g19_frame
+import g19_io
 
+import atexit
+import errno
+import hashlib
+import os
 import sys
 import threading
 import time
 import usb
-import PIL.Image as Img
+
+# keys under which settings are coalesced, see G19.set_max_control_rate()
+SETTINGS = ['bgColor', 'displayBrightness', 'mKeys']
+
+# default maximum number of control messages per second per setting
+MAX_CONTROL_RATE = 20
+
+# seconds between the first attempts to reopen a lost device; doubled after
+# each failed attempt up to MAX_RECONNECT_DELAY
+RECONNECT_DELAY = 0.01
+MAX_RECONNECT_DELAY = 0.2
+
+
+# errors of transfers to an unplugged device
+_DEVICE_LOST_ERRNOS = [errno.ENODEV, errno.ESHUTDOWN]
+
+
+def _is_device_lost(error):
+    '''Returns whether a usb.USBError means that the device is gone.
+
+    pyusb 1.x sets errno of its errors.  pyusb 0.x only passes on the message
+    of libusb-0.1, whose Linux backend appends the strerror() text of the
+    failing ioctl, e.g. "error submitting URB: No such device"; without an
+    errno, that text is looked for.
+
+    '''
+    code = getattr(error, 'errno', None)
+    if code is not None:
+        return code in _DEVICE_LOST_ERRNOS
+    message = str(error)
+    for code in _DEVICE_LOST_ERRNOS:
+        if os.strerror(code) in message:
+            return True
+    return False
+
+
+def _list_bytes(data):
+    '''Returns list frame data as bytearray, for fingerprinting it.
+
+    Items are truncated to their low byte, as the USB layer would do.
+
+    '''
+    try:
+        return bytearray(data)
+    except ValueError:
+        return bytearray(val & 0xff for val in data)
+
 
 class G19(object):
     '''Simple access to Logitech G19 features.
 
-    All methods are thread-safe if not denoted otherwise.
+    All methods are thread-safe if not denoted otherwise.  Frames and control
+    messages are executed by one G19IoScheduler thread per USB handle, so
+    traffic on one interface does not wait for another one.  Interrupt
+    endpoints are read directly by the calling thread, so a blocking read
+    does not delay any other transfer.
+
+    Each handle has its own lock, held by its I/O thread while executing an
+    operation, and each interrupt endpoint has its own lock held while
+    reading it.  Code needing more than one of them must acquire them in the
+    order If0, If1, endpoint 0x81, 0x82, 0x83.
+
+    Settings (backlight color, display brightness, M-key LEDs) are applied
+    asynchronously: a value still waiting for transmission is replaced by a
+    newer one of the same setting, and each setting is sent at most
+    MAX_CONTROL_RATE times per second.  The values set are remembered: the
+    getters return them without asking the device, setting a value again is
+    not transmitted, and all of them are set again after reset().
+
+    If the device gets lost (e.g. unplugged), G19 reopens it in the
+    background as soon as it is back, and sets the remembered settings
+    again.  Meanwhile frames are dropped and key reads return no data, so
+    applets and the event handling keep running.  A bus reset (see reset())
+    is handled the same way, as the device gets a new address then.
 
     '''
 
-    def __init__(self, resetOnStart=False):
-        '''Initializes and opens the USB device.'''
-        self.__usbDevice = G19UsbController(resetOnStart)
-        self.__usbDeviceMutex = threading.Lock()
+    def __init__(self, resetOnStart=False, usbDevice=None):
+        '''Initializes and opens the USB device.
+
+        @param resetOnStart Whether to reset the device when opening it.
+        @param usbDevice Controller to use instead of opening the USB device,
+        e.g. for benchmarking.  It must provide the handles of a
+        G19UsbController.
+
+        '''
+        if usbDevice is None:
+            usbDevice = G19UsbController(resetOnStart)
+        self.__usbDevice = usbDevice
+        # guards the frame state below, which is only changed by the I/O
+        # thread of If0
+        self.__frameMutex = threading.Lock()
+        self.__scratchFrame = g19_frame.FrameBuffer()
+        self.__partialUpdates = False
+        self.__lastFrame = None
+        self.__lastFingerprint = None
+        self.__framesSent = 0
+        self.__framesSkipped = 0
+        self.__bytesSaved = 0
+        # LCD bulk endpoint and display keys
+        self.__ioIf0 = _start_io_scheduler()
+        # backlight, LEDs, G- and M-keys
+        self.__ioIf1 = _start_io_scheduler()
+        self.__readLocks = {0x81: threading.Lock(),
+                            0x82: threading.Lock(),
+                            0x83: threading.Lock()}
         self.__keyReceiver = G19Receiver(self)
         self.__threadDisplay = None
+        # setting -> (value, control message arguments) of the values set
+        self.__state = {}
+        self.__stateSuppressed = dict((name, 0) for name in SETTINGS)
+        # setting -> future of the control message sent last
+        self.__settingFutures = {}
+        # settings whose control message sent last failed
+        self.__stateUnsent = set()
+        # reentrant, as a future already done calls back right away
+        self.__stateMutex = threading.RLock()
+        self.set_max_control_rate(MAX_CONTROL_RATE)
+        # guards the connection state below
+        self.__connectionMutex = threading.Lock()
+        self.__connected = True
+        self.__lostAt = None
+        self.__disconnects = 0
+        self.__reconnects = 0
+        self.__lastDowntime = 0.0
+        self.__maxReopenTime = 0.0
+        self.__framesLost = 0
 
     @staticmethod
     def convert_image_to_frame(filename):
@@ -27,22 +147,12 @@ class G19(object):
         Format will be auto-detected.  If neccessary, the image will be resized
         to 320x240.
 
+        @param filename Image file to load.  A PIL image or an RGB array may be
+        given instead.
         @return Frame data to be used with send_frame().
 
         '''
-        img = Img.open(filename)
-        access = img.load()
-        if img.size != (320, 240):
-            img = img.resize((320, 240), Img.CUBIC)
-            access = img.load()
-        data = []
-        for x in range(320):
-            for y in range(240):
-                r, g, b = access[x, y]
-                val = G19.rgb_to_uint16(r, g, b)
-                data.append(val >> 8)
-                data.append(val & 0xff)
-        return data
+        return g19_frame.image_to_frame(filename)
 
     @staticmethod
     def rgb_to_uint16(r, g, b):
@@ -73,10 +183,113 @@ class G19(object):
         # saved in little-endian, because USB is little-endian
         value = self.rgb_to_uint16(r, g, b)
         valueH = value & 0xff
-        valueL = value >> 8
-        frame = [valueL, valueH] * (320 * 240)
+        valueL = (value >> 8) & 0xff
+        frame = g19_frame.FrameBuffer()
+        frame.fill(valueL, valueH)
         self.send_frame(frame)
 
+    def get_bg_color(self):
+        '''Returns the backlight color set last as (r, g, b), or None.'''
+        return self.__get_setting('bgColor')
+
+    def get_connection_statistics(self):
+        '''Returns how often the device was lost and how fast it was back.
+
+        @return Dictionary containing whether the device is connected
+        ('connected'), the number of times it was lost ('disconnects') and
+        reopened ('reconnects'), the time in seconds from the last loss until
+        the device was reopened ('lastDowntime'), the longest time an attempt
+        to reopen the device succeeded in ('maxReopenTime'), and the number
+        of frames dropped while the device was lost ('framesLost').
+
+        '''
+        self.__connectionMutex.acquire()
+        try:
+            return {'connected': self.__connected,
+                    'disconnects': self.__disconnects,
+                    'reconnects': self.__reconnects,
+                    'lastDowntime': self.__lastDowntime,
+                    'maxReopenTime': self.__maxReopenTime,
+                    'framesLost': self.__framesLost}
+        finally:
+            self.__connectionMutex.release()
+
+    def get_control_statistics(self):
+        '''Returns how many settings commands were sent and coalesced.
+
+        @return Dictionary mapping the names in SETTINGS to dictionaries
+        containing the number of control messages sent ('issued'), of values
+        replaced by newer ones before being sent ('coalesced'), and of values
+        not sent as they were set already ('suppressed').
+
+        '''
+        stats = self.__ioIf1.get_coalescing_statistics()
+        self.__stateMutex.acquire()
+        try:
+            result = {}
+            for name in SETTINGS:
+                result[name] = dict(stats.get(name,
+                        {'issued': 0, 'coalesced': 0}))
+                result[name]['suppressed'] = self.__stateSuppressed[name]
+            return result
+        finally:
+            self.__stateMutex.release()
+
+    def get_display_brightness(self):
+        '''Returns the display brightness set last, or None.'''
+        return self.__get_setting('displayBrightness')
+
+    def get_enabled_m_keys(self):
+        '''Returns the lit keys set last, or None.
+
+        See set_enabled_m_keys().
+
+        '''
+        return self.__get_setting('mKeys')
+
+    def get_frame_statistics(self):
+        '''Returns counters about frames given to send_frame().
+
+        @return Dictionary with the number of frames transmitted
+        ('framesSent'), the number of unchanged frames which were not
+        transmitted ('framesSkipped'), and the number of bytes not transmitted
+        thanks to skipping frames and partial updates ('bytesSaved').
+
+        '''
+        self.__frameMutex.acquire()
+        try:
+            return {'framesSent': self.__framesSent,
+                    'framesSkipped': self.__framesSkipped,
+                    'bytesSaved': self.__bytesSaved}
+        finally:
+            self.__frameMutex.release()
+
+    def get_input_statistics(self):
+        '''Returns statistics about the input processors of all applets.
+
+        @return See InputDispatcher.get_statistics().
+
+        '''
+        return self.__keyReceiver.get_dispatch_statistics()
+
+    def get_io_statistics(self):
+        '''Returns the queueing delays of USB operations per traffic class.
+
+        @return Dictionary mapping 'if0' and 'if1' to the statistics of the
+        interface's I/O thread (see G19IoScheduler.get_statistics()).
+
+        '''
+        return {'if0': self.__ioIf0.get_statistics(),
+                'if1': self.__ioIf1.get_statistics()}
+
+    def is_connected(self):
+        '''Returns whether the device is usable, i.e. not lost.'''
+        self.__connectionMutex.acquire()
+        try:
+            return self.__connected
+        finally:
+            self.__connectionMutex.release()
+
     def load_image(self, filename):
         '''Loads image from given file.
 
@@ -86,63 +299,155 @@ class G19(object):
         '''
         self.send_frame(self.convert_image_to_frame(filename))
 
-    def read_g_and_m_keys(self, maxLen=20):
+    def __get_setting(self, name):
+        self.__stateMutex.acquire()
+        try:
+            if name not in self.__state:
+                return None
+            return self.__state[name][0]
+        finally:
+            self.__stateMutex.release()
+
+    def read_g_and_m_keys(self, maxLen=20, timeout=10):
         '''Reads interrupt data from G, M and light switch keys.
 
         @return maxLen Maximum number of bytes to read.
+        @param timeout Maximum time to wait for data in milliseconds.
         @return Read data or empty list.
 
         '''
-        self.__usbDeviceMutex.acquire()
-        val = []
-        try:
-            val = list(self.__usbDevice.handleIf1.interruptRead(
-                0x83, maxLen, 10))
-        except usb.USBError:
-            pass
-        finally:
-            self.__usbDeviceMutex.release()
-        return val
+        return self.__read_interrupt(
+                self.__usbDevice.handleIf1, 0x83, maxLen, timeout)
 
-    def read_display_menu_keys(self):
+    def read_display_menu_keys(self, timeout=10):
         '''Reads interrupt data from display keys.
 
+        @param timeout Maximum time to wait for data in milliseconds.
         @return Read data or empty list.
 
         '''
-        self.__usbDeviceMutex.acquire()
-        val = []
-        try:
-            val = list(self.__usbDevice.handleIf0.interruptRead(0x81, 2, 10))
-        except usb.USBError:
-            pass
-        finally:
-            self.__usbDeviceMutex.release()
-        return val
+        return self.__read_interrupt(
+                self.__usbDevice.handleIf0, 0x81, 2, timeout)
 
-    def read_multimedia_keys(self):
+    def read_multimedia_keys(self, timeout=10):
         '''Reads interrupt data from multimedia keys.
 
+        @param timeout Maximum time to wait for data in milliseconds.
         @return Read data or empty list.
 
         '''
-        self.__usbDeviceMutex.acquire()
-        val = []
+        return self.__read_interrupt(
+                self.__usbDevice.handleIfMM, 0x82, 2, timeout)
+
+    def __read_interrupt(self, handle, endpoint, maxLen, timeout):
+        '''Reads interrupt data from given endpoint.
+
+        @return Read data or empty list.
+
+        '''
+        lock = self.__readLocks[endpoint]
+        lock.acquire()
         try:
-            val = list(self.__usbDevice.handleIfMM.interruptRead(0x82, 2, 10))
-        except usb.USBError:
-            pass
+            return list(handle.interruptRead(endpoint, maxLen, timeout))
+        except usb.USBError, e:
+            if _is_device_lost(e):
+                self.__device_lost(e)
+            return []
+        finally:
+            lock.release()
+
+    def __device_lost(self, error):
+        '''Starts reopening the device in the background, if not yet done.'''
+        self.__connectionMutex.acquire()
+        try:
+            if not self.__connected:
+                return
+            self.__connected = False
+            self.__lostAt = monotonic()
+            self.__disconnects += 1
+        finally:
+            self.__connectionMutex.release()
+        print "G19 lost, reconnecting: {0}".format(error)
+        thread = threading.Thread(target=self.__reconnect)
+        thread.daemon = True
+        thread.start()
+
+    def __reconnect(self):
+        '''Reopens the lost device, retrying with exponential backoff.'''
+        delay = RECONNECT_DELAY
+        while not self.__reopen():
+            time.sleep(delay)
+            delay = min(2 * delay, MAX_RECONNECT_DELAY)
+        print "G19 reconnected after {0:.3f} s".format(self.__lastDowntime)
+        self.__restore_state()
+
+    def __reopen(self):
+        '''Tries once to reopen the device.
+
+        @return True on success.
+
+        '''
+        locks = [self.__ioIf0.get_lock(), self.__ioIf1.get_lock()]
+        locks += [self.__readLocks[endpoint]
+                for endpoint in sorted(self.__readLocks)]
+        start = monotonic()
+        for lock in locks:
+            lock.acquire()
+        try:
+            try:
+                self.__usbDevice.reconnect()
+            except usb.USBError:
+                return False
+            self.__frameMutex.acquire()
+            try:
+                self.__lastFrame = None
+                self.__lastFingerprint = None
+            finally:
+                self.__frameMutex.release()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        now = monotonic()
+        self.__connectionMutex.acquire()
+        try:
+            self.__connected = True
+            self.__reconnects += 1
+            self.__lastDowntime = now - self.__lostAt
+            self.__maxReopenTime = max(self.__maxReopenTime, now - start)
         finally:
-            self.__usbDeviceMutex.release()
-        return val
+            self.__connectionMutex.release()
+        return True
 
     def reset(self):
         '''Initiates a bus reset to USB device.'''
-        self.__usbDeviceMutex.acquire()
+        # lock order: If0, If1
+        lockIf0 = self.__ioIf0.get_lock()
+        lockIf1 = self.__ioIf1.get_lock()
+        lockIf0.acquire()
         try:
-            self.__usbDevice.reset()
+            lockIf1.acquire()
+            try:
+                self.__frameMutex.acquire()
+                try:
+                    self.__lastFrame = None
+                    self.__lastFingerprint = None
+                finally:
+                    self.__frameMutex.release()
+                self.__usbDevice.reset()
+            finally:
+                lockIf1.release()
         finally:
-            self.__usbDeviceMutex.release()
+            lockIf0.release()
+        self.__restore_state()
+
+    def __restore_state(self):
+        '''Sends all settings set so far again, e.g. after a reset.'''
+        self.__stateMutex.acquire()
+        try:
+            for name, (value, args) in self.__state.items():
+                self.__send_setting(name, *args)
+        finally:
+            self.__stateMutex.release()
 
     def save_default_bg_color(self, r, g, b):
         '''This stores given color permanently to keyboard.
@@ -152,82 +457,314 @@ class G19(object):
         '''
         rtype = usb.TYPE_CLASS | usb.RECIP_INTERFACE
         colorData = [7, r, g, b]
-        self.__usbDeviceMutex.acquire()
+        self.__send_control(rtype, 0x09, colorData, 0x308, 0x01, 1000)
+
+    def __control_msg(self, *args):
+        '''Sends a control message via If1.  Executed by the I/O thread.'''
+        try:
+            return self.__usbDevice.handleIf1.controlMsg(*args)
+        except usb.USBError, e:
+            if _is_device_lost(e):
+                self.__device_lost(e)
+            raise
+
+    def __send_control(self, *args):
+        '''Sends a control message via If1 and waits for its completion.'''
+        return self.__ioIf1.submit(g19_io.CONTROL, self.__control_msg,
+                *args).result()
+
+    def __send_setting(self, name, *args):
+        '''Schedules a control message via If1 setting a coalesced setting.
+
+        Must be called with the state mutex held.  Failures are reported by
+        __setting_sent().
+
+        @param name Setting, one of SETTINGS.
+        @return Future, done when the value or a newer one was sent.
+
+        '''
+        future = self.__ioIf1.submit_latest(g19_io.CONTROL, name,
+                self.__control_msg, *args)
+        # a coalesced value shares the future of the pending one
+        if self.__settingFutures.get(name) is not future:
+            self.__settingFutures[name] = future
+            future.add_done_callback(
+                    lambda future: self.__setting_sent(name, future))
+        return future
+
+    def __setting_sent(self, name, future):
+        '''Records whether a setting was sent.  Called by the future.
+
+        A setting which could not be sent is reported, and is not suppressed
+        when set to the same value again.
+
+        '''
+        exception = future.exception()
+        self.__stateMutex.acquire()
+        try:
+            if self.__settingFutures.get(name) is not future:
+                # a newer value is on its way
+                return
+            if exception is None:
+                self.__stateUnsent.discard(name)
+            else:
+                self.__stateUnsent.add(name)
+        finally:
+            self.__stateMutex.release()
+        if exception is not None:
+            print "G19 setting {0} not sent: {1}".format(name, exception)
+
+    def __set_setting(self, name, value, *args):
+        '''Changes a setting, unless it has given value already.
+
+        The value is recorded right away, so getters return it while it is
+        being sent.  If sending fails, setting the same value again sends it
+        again.
+
+        @param name Setting, one of SETTINGS.
+        @param value New value, as returned by the getter.
+        @param args Arguments of the control message setting the value.
+        @return Future, done when the value or a newer one was sent.
+
+        '''
+        self.__stateMutex.acquire()
         try:
-            self.__usbDevice.handleIf1.controlMsg(
-                rtype, 0x09, colorData, 0x308, 0x01, 1000)
+            if name in self.__state and name not in self.__stateUnsent and \
+                    self.__state[name][0] == value:
+                self.__stateSuppressed[name] += 1
+                future = g19_io.Future()
+                future.set_result(None)
+                return future
+            self.__state[name] = (value, args)
+            # submitting with the mutex held keeps the order of values
+            return self.__send_setting(name, *args)
         finally:
-            self.__usbDeviceMutex.release()
+            self.__stateMutex.release()
 
-    def send_frame(self, data):
+    def send_frame(self, data, force=False):
         '''Sends a frame to display.
 
-        @param data 320x240x2 bytes, containing the frame in little-endian
-        16bit highcolor (5-6-5) format.
+        A frame equal to the one sent before is not transmitted again, unless
+        force is set.  If partial updates are enabled (see
+        set_partial_updates()), only the windows that changed since the
+        previous frame will be transmitted.
+
+        @param data Either a FrameBuffer, which will be sent without copying
+        it, or 320x240x2 bytes (list of ints, str or bytearray), containing the
+        frame in little-endian 16bit highcolor (5-6-5) format.
         Image must be row-wise, starting at upper left corner and ending at
         lower right.  This means (data[0], data[1]) is the first pixel and
         (data[239 * 2], data[239 * 2 + 1]) the lower left one.
+        @param force If True, the complete frame will be transmitted in any
+        case.
 
         '''
-        if len(data) != (320 * 240 * 2):
+        self.send_frame_async(data, force).result()
+
+    def send_frame_async(self, data, force=False):
+        '''Schedules a frame for sending to display and returns immediately.
+
+        Frames do not queue up: if the frame given by the previous call is
+        still waiting for transmission, it will be dropped in favor of this
+        one.  A FrameBuffer must not be changed before the returned Future is
+        done, unless the frame may be sent with the changed content.
+
+        @param data Frame data, see send_frame().
+        @param force See send_frame().
+        @return Future, done when the frame was sent or dropped.
+
+        '''
+        if len(data) != g19_frame.FRAME_SIZE:
             raise ValueError("illegal frame size: " + str(len(data))
-                    + " should be 320x240x2=" + str(320 * 240 * 2))
-        frame = [0x10, 0x0F, 0x00, 0x58, 0x02, 0x00, 0x00, 0x00,
-                 0x00, 0x00, 0x00, 0x3F, 0x01, 0xEF, 0x00, 0x0F]
-        for i in range(16, 256):
-            frame.append(i)
-        for i in range(256):
-            frame.append(i)
+                    + " should be 320x240x2=" + str(g19_frame.FRAME_SIZE))
+        return self.__ioIf0.submit_frame(self.__write_frame, data, force)
+
+    def __bulk_write(self, data):
+        '''Writes to the LCD.  Executed by the I/O thread.
 
-        frame += data
+        @return False if the device is lost, the data is dropped then.
 
-        self.__usbDeviceMutex.acquire()
+        '''
         try:
-            self.__usbDevice.handleIf0.bulkWrite(2, frame, 1000)
+            self.__usbDevice.handleIf0.bulkWrite(2, data, 1000)
+            return True
+        except usb.USBError, e:
+            if not _is_device_lost(e):
+                raise
+            self.__device_lost(e)
+            self.__connectionMutex.acquire()
+            self.__framesLost += 1
+            self.__connectionMutex.release()
+            return False
+
+    def __write_frame(self, data, force):
+        '''Transmits a frame.  Executed by the I/O thread.'''
+        self.__frameMutex.acquire()
+        try:
+            frame, pixels = self.__pack_frame(data)
+            # forced frames are not compared, so they are not fingerprinted;
+            # the next frame is then sent in any case
+            fingerprint = None
+            if not force:
+                if pixels is None:
+                    fingerprint = hashlib.md5(_list_bytes(data)).digest()
+                else:
+                    fingerprint = hashlib.md5(pixels).digest()
+                if fingerprint == self.__lastFingerprint:
+                    self.__framesSkipped += 1
+                    self.__bytesSaved += len(frame)
+                    return
+
+            lastFrame = self.__lastFrame
+            self.__lastFrame = None
+            self.__lastFingerprint = None
+            if lastFrame is not None and not force:
+                regions = g19_frame.find_dirty_regions(lastFrame, pixels)
+                size = sum(g19_frame.HEADER_SIZE + width * height * 2
+                        for x, y, width, height in regions)
+                if size < len(frame):
+                    for x, y, width, height in regions:
+                        region = g19_frame.make_header(x, y, width, height)
+                        region += g19_frame.extract_region(
+                                pixels, x, y, width, height)
+                        if not self.__bulk_write(region):
+                            return
+                    lastFrame[:] = pixels
+                    self.__lastFrame = lastFrame
+                    self.__lastFingerprint = fingerprint
+                    self.__framesSent += 1
+                    self.__bytesSaved += len(frame) - size
+                    return
+            if not self.__bulk_write(frame):
+                return
+            if self.__partialUpdates:
+                self.__lastFrame = bytearray(pixels)
+            self.__lastFingerprint = fingerprint
+            self.__framesSent += 1
         finally:
-            self.__usbDeviceMutex.release()
+            self.__frameMutex.release()
+
+    def __pack_frame(self, data):
+        '''Returns the buffer to transmit for given frame data, and its pixels.
+
+        The pixels are only provided if partial updates are enabled, as list
+        data has to be copied for that.  Must be called with the frame mutex
+        held.
+
+        @return Pair of buffer to send and pixel data (or None).
+
+        '''
+        if isinstance(data, g19_frame.FrameBuffer):
+            return (data.get_buffer(), data.get_data_view())
+        if isinstance(data, list) and not self.__partialUpdates:
+            # list API: values are passed on as they are
+            frame = list(g19_frame.FRAME_HEADER)
+            frame += data
+            return (frame, None)
+        self.__scratchFrame.set_data(data)
+        return (self.__scratchFrame.get_buffer(),
+                self.__scratchFrame.get_data_view())
+
+    def send_region(self, x, y, width, height, data):
+        '''Sends pixel data for a window of the display.
+
+        The rest of the display keeps its content.
+
+        @param x Leftmost column of the window.
+        @param y Topmost row of the window.
+        @param width Width of the window.
+        @param height Height of the window.
+        @param data width x height x 2 bytes, laid out like the data given to
+        send_frame() (column by column, each column from top to bottom).
+
+        '''
+        if len(data) != width * height * 2:
+            raise ValueError("illegal region size: " + str(len(data))
+                    + " should be {0}x{1}x2={2}".format(
+                            width, height, width * height * 2))
+        frame = g19_frame.make_header(x, y, width, height)
+        frame[g19_frame.HEADER_SIZE:] = data
+        self.__ioIf0.submit(g19_io.FRAME, self.__write_region, frame).result()
+
+    def __write_region(self, frame):
+        '''Transmits a window of the display.  Executed by the I/O thread.'''
+        self.__frameMutex.acquire()
+        try:
+            # display content is not fully known anymore
+            self.__lastFrame = None
+            self.__lastFingerprint = None
+        finally:
+            self.__frameMutex.release()
+        self.__bulk_write(frame)
 
     def set_bg_color(self, r, g, b):
-        '''Sets backlight to given color.'''
+        '''Sets backlight to given color.
+
+        Returns immediately, see the class description.
+
+        @return Future, done when the color or a newer one was sent.
+
+        '''
         rtype = usb.TYPE_CLASS | usb.RECIP_INTERFACE
         colorData = [7, r, g, b]
-        self.__usbDeviceMutex.acquire()
-        try:
-            self.__usbDevice.handleIf1.controlMsg(
-                rtype, 0x09, colorData, 0x307, 0x01, 10)
-        finally:
-            self.__usbDeviceMutex.release()
+        return self.__set_setting('bgColor', (r, g, b), rtype, 0x09,
+                colorData, 0x307, 0x01, 10)
 
     def set_enabled_m_keys(self, keys):
         '''Sets currently lit keys as an OR-combination of LIGHT_KEY_M1..3,R.
 
+        Returns immediately, see the class description.
+
         example:
             from logitech.g19_keys import Data
             lg19 = G19()
             lg19.set_enabled_m_keys(Data.LIGHT_KEY_M1 | Data.LIGHT_KEY_MR)
 
+        @return Future, done when the keys or newer ones were sent.
+
         '''
         rtype = usb.TYPE_CLASS | usb.RECIP_INTERFACE
-        self.__usbDeviceMutex.acquire()
-        try:
-            self.__usbDevice.handleIf1.controlMsg(
-                rtype, 0x09, [5, keys], 0x305, 0x01, 10)
-        finally:
-            self.__usbDeviceMutex.release()
+        return self.__set_setting('mKeys', keys, rtype, 0x09, [5, keys],
+                0x305, 0x01, 10)
 
     def set_display_brightness(self, val):
         '''Sets display brightness.
 
+        Returns immediately, see the class description.
+
         @param val in [0,100] (off..maximum).
+        @return Future, done when the brightness or a newer one was sent.
 
         '''
         data = [val, 0xe2, 0x12, 0x00, 0x8c, 0x11, 0x00, 0x10, 0x00]
         rtype = usb.TYPE_VENDOR | usb.RECIP_INTERFACE
-        self.__usbDeviceMutex.acquire()
+        return self.__set_setting('displayBrightness', val, rtype, 0x0a,
+                data, 0x0, 0x0)
+
+    def set_max_control_rate(self, rate):
+        '''Limits how often each setting is sent to the device.
+
+        @param rate Maximum number of control messages per second and setting,
+        or None for no limit.
+
+        '''
+        for name in SETTINGS:
+            self.__ioIf1.set_rate_limit(name, rate)
+
+    def set_partial_updates(self, enabled):
+        '''Enables or disables partial display updates.
+
+        If enabled, send_frame() compares each frame to the previous one and
+        transmits only the windows which changed.  This saves USB bandwidth
+        for mostly static content.
+
+        '''
+        self.__frameMutex.acquire()
         try:
-            self.__usbDevice.handleIf1.controlMsg(rtype, 0x0a, data, 0x0, 0x0)
+            self.__partialUpdates = enabled
+            self.__lastFrame = None
         finally:
-            self.__usbDeviceMutex.release()
+            self.__frameMutex.release()
 
     def set_display_colorful(self):
         '''This is an example how to create an image having a green to red
@@ -269,6 +806,27 @@ class G19(object):
             self.__threadDisplay = None
 
 
+def _start_io_scheduler():
+    '''Starts a G19IoScheduler on a new daemon thread.
+
+    The scheduler will be stopped when the interpreter exits.
+
+    '''
+    scheduler = G19IoScheduler()
+    scheduler.start()
+    thread = threading.Thread(target=scheduler.run)
+    thread.daemon = True
+    thread.start()
+    atexit.register(_stop_io_scheduler, scheduler, thread)
+    return scheduler
+
+
+def _stop_io_scheduler(scheduler, thread):
+    '''Stops an I/O scheduler thread before the interpreter shuts down.'''
+    scheduler.stop()
+    thread.join(1.0)
+
+
 class G19UsbController(object):
     '''Controller for accessing the G19 USB device.
 
@@ -278,7 +836,8 @@ class G19UsbController(object):
               MI00: keyboard
                   EP 0x81(in)  - INT the keyboard itself
               MI01: (ifacMM)
-                  EP 0x82(in)  - multimedia keys, incl. scroll and Winkey-switch
+                  EP 0x82(in)  - multimedia keys, incl. scroll and
+                                 Winkey-switch
 
         * 046d:c229
           LCD display with two interfaces:
@@ -291,43 +850,71 @@ class G19UsbController(object):
     '''
 
     def __init__(self, resetOnStart=False):
-        self.__lcd_device = self._find_device(0x046d, 0xc229)
-        if not self.__lcd_device:
+        self.handleIf0 = None
+        self.handleIf1 = None
+        self.handleIfMM = None
+        # handles having claimed an interface
+        self.__claimed = []
+        self.__open(resetOnStart)
+
+    def __open(self, resetOnStart):
+        '''Finds the device on the buses, opens it and claims the interfaces.
+
+        The handles are only replaced once all interfaces are claimed.
+
+        @raise usb.USBError if the device cannot be found or opened.
+
+        '''
+        lcdDevice = self._find_device(0x046d, 0xc229)
+        if not lcdDevice:
             raise usb.USBError("G19 LCD not found on USB bus")
-        self.__kbd_device = self._find_device(0x046d, 0xc228)
-        if not self.__kbd_device:
+        kbdDevice = self._find_device(0x046d, 0xc228)
+        if not kbdDevice:
             raise usb.USBError("G19 keyboard not found on USB bus")
-        self.handleIf0 = self.__lcd_device.open()
+        handleIf0 = lcdDevice.open()
         if resetOnStart:
-            self.handleIf0.reset()
-            self.handleIf0 = self.__lcd_device.open()
+            handleIf0.reset()
+            handleIf0 = lcdDevice.open()
 
-        self.handleIf1 = self.__lcd_device.open()
-        self.handleIfMM = self.__kbd_device.open()
-        config = self.__lcd_device.configurations[0]
+        handleIf1 = lcdDevice.open()
+        handleIfMM = kbdDevice.open()
+        config = lcdDevice.configurations[0]
         iface0 = config.interfaces[0][0]
         iface1 = config.interfaces[1][0]
 
         try:
-            self.handleIfMM.setConfiguration(1)
+            handleIfMM.setConfiguration(1)
         except usb.USBError:
             pass
 
         try:
-            self.handleIf1.detachKernelDriver(iface1)
+            handleIf1.detachKernelDriver(iface1)
         except usb.USBError:
             pass
 
         try:
-            self.handleIfMM.detachKernelDriver(1)
+            handleIfMM.detachKernelDriver(1)
         except usb.USBError:
             pass
 
-        self.handleIf0.setConfiguration(1)
-        self.handleIf1.setConfiguration(1)
-        self.handleIf0.claimInterface(iface0)
-        self.handleIf1.claimInterface(iface1)
-        self.handleIfMM.claimInterface(1)
+        handleIf0.setConfiguration(1)
+        handleIf1.setConfiguration(1)
+        claimed = []
+        try:
+            for handle, iface in [(handleIf0, iface0), (handleIf1, iface1),
+                    (handleIfMM, 1)]:
+                handle.claimInterface(iface)
+                claimed.append(handle)
+        except usb.USBError:
+            self._release_interfaces(claimed)
+            raise
+
+        self.__lcd_device = lcdDevice
+        self.__kbd_device = kbdDevice
+        self.handleIf0 = handleIf0
+        self.handleIf1 = handleIf1
+        self.handleIfMM = handleIfMM
+        self.__claimed = claimed
 
     @staticmethod
     def _find_device(idVendor, idProduct):
@@ -338,6 +925,34 @@ class G19UsbController(object):
                     return dev
         return None
 
+    def reconnect(self):
+        '''Opens the device again, e.g. after it was unplugged.
+
+        The buses are scanned again, as the device gets a new address when
+        it comes back.  The handles are replaced by new ones.  The interfaces
+        claimed by the old ones are released first, as they would keep a
+        device that was not really gone from being claimed again.
+
+        @raise usb.USBError if the device cannot be found or opened.
+
+        '''
+        self._release_interfaces(self.__claimed)
+        self.__claimed = []
+        self.__open(False)
+
+    @staticmethod
+    def _release_interfaces(claimed):
+        '''Releases the interfaces claimed by given handles.
+
+        Errors are ignored, as the handles of a lost device are dead already.
+
+        '''
+        for handle in reversed(claimed):
+            try:
+                handle.releaseInterface()
+            except usb.USBError:
+                pass
+
     def reset(self):
         '''Resets the device on the USB.'''
         self.handleIf0.reset()
@@ -0,0 +1,245 @@
+from frame_pacer import monotonic
+from g19_keys import Key
+import g19_frame
+
+import threading
+import time
+
+
+class VirtualScreen(object):
+    '''Display of a single applet, see DisplayManager.create_screen().
+
+    Provides the display methods of G19.  What is sent to a screen reaches
+    the display only while the screen is visible; otherwise it is kept and
+    shown as soon as the screen gets the focus.  Sending to an invisible
+    screen is throttled to the background rate of its manager, so producers
+    not reacting to their visibility do not waste CPU time either.
+
+    All methods are thread-safe.
+
+    '''
+
+    def __init__(self, manager, name):
+        self.__manager = manager
+        self.__name = name
+        # content of the screen; guarded by the lock of the manager
+        self._frame = g19_frame.FrameBuffer()
+        self.__callback = None
+        self.__nextBackgroundFrame = 0.0
+
+    def get_name(self):
+        return self.__name
+
+    def is_visible(self):
+        '''Returns whether this screen has the focus.'''
+        return self.__manager.get_focused_screen() is self
+
+    def send_frame(self, data, force=False):
+        '''Sends a frame to this screen.
+
+        @param data Frame data, see G19.send_frame().
+        @param force See G19.send_frame().  Only effective while visible.
+
+        '''
+        if not self.__manager._send_frame(self, data, force):
+            self.__throttle()
+
+    def send_region(self, x, y, width, height, data):
+        '''Sends pixel data for a window of this screen.
+
+        @param data Pixel data, see G19.send_region().
+
+        '''
+        if not self.__manager._send_region(self, x, y, width, height, data):
+            self.__throttle()
+
+    def set_visibility_callback(self, callback):
+        '''Sets the function called when this screen gets or loses the focus.
+
+        @param callback Function taking whether the screen is visible now, or
+        None.  It is called without any lock held.
+
+        '''
+        self.__callback = callback
+
+    def _visibility_changed(self, visible):
+        callback = self.__callback
+        if callback is not None:
+            callback(visible)
+
+    def __throttle(self):
+        '''Delays a producer sending to this screen while invisible.'''
+        now = monotonic()
+        delay = self.__nextBackgroundFrame - now
+        if delay > 0:
+            time.sleep(delay)
+            now += delay
+        self.__nextBackgroundFrame = now + \
+                1.0 / self.__manager.get_background_fps()
+
+
+class DisplayManager(object):
+    '''Lets several applets share the display.
+
+    Each applet draws to its own VirtualScreen.  Only the screen having the
+    focus is shown; pressing the switch key (MENU by default) gives the
+    focus to the next screen, which is then shown with its current content
+    right away.  Applets are told about focus changes via the visibility
+    callback of their screen, so they can pause while in the background.
+
+    All methods are thread-safe.  Frames are sent with the lock of the
+    manager held, so a focus change never interleaves with them.
+
+    '''
+
+    def __init__(self, lg19, switchKey=Key.MENU, backgroundFps=1):
+        '''Creates a manager.
+
+        @param lg19 G19 to show screens on.
+        @param switchKey Key switching to the next screen.
+        @param backgroundFps Maximum frame rate accepted from screens in the
+        background.
+
+        '''
+        self.__lg19 = lg19
+        self.__switchKey = switchKey
+        self.__backgroundFps = backgroundFps
+        self.__lock = threading.Lock()
+        self.__screens = []
+        self.__focused = None
+        self.__framesShown = 0
+        self.__framesHidden = 0
+        self.__switches = 0
+
+    def create_screen(self, name):
+        '''Creates a screen for an applet.
+
+        The first screen created gets the focus.
+
+        @param name Name of the screen, for display purposes only.
+        @return The VirtualScreen.
+
+        '''
+        screen = VirtualScreen(self, name)
+        self.__lock.acquire()
+        try:
+            self.__screens.append(screen)
+            if self.__focused is None:
+                self.__focused = screen
+        finally:
+            self.__lock.release()
+        return screen
+
+    def focus(self, screen):
+        '''Gives the focus to a screen and shows its content.'''
+        self.__lock.acquire()
+        try:
+            previous = self.__focused
+            if screen is previous:
+                return
+            if screen not in self.__screens:
+                raise ValueError("unknown screen: " + screen.get_name())
+            self.__focused = screen
+            self.__switches += 1
+            # the display shows another screen's content
+            self.__lg19.send_frame(screen._frame, True)
+        finally:
+            self.__lock.release()
+        if previous is not None:
+            previous._visibility_changed(False)
+        screen._visibility_changed(True)
+
+    def focus_next(self):
+        '''Gives the focus to the screen created after the focused one.'''
+        self.__lock.acquire()
+        try:
+            if not self.__screens:
+                return
+            if self.__focused is None:
+                screen = self.__screens[0]
+            else:
+                index = self.__screens.index(self.__focused)
+                screen = self.__screens[(index + 1) % len(self.__screens)]
+        finally:
+            self.__lock.release()
+        self.focus(screen)
+
+    def get_background_fps(self):
+        return self.__backgroundFps
+
+    def get_focused_screen(self):
+        '''Returns the screen having the focus, or None if there is none.'''
+        self.__lock.acquire()
+        try:
+            return self.__focused
+        finally:
+            self.__lock.release()
+
+    def get_input_processor(self):
+        return self
+
+    def get_statistics(self):
+        '''Returns how the screens used the display.
+
+        @return Dictionary containing the number of frames shown ('shown') and
+        kept for invisible screens ('hidden'), and the number of focus changes
+        ('switches').
+
+        '''
+        self.__lock.acquire()
+        try:
+            return {'shown': self.__framesShown,
+                    'hidden': self.__framesHidden,
+                    'switches': self.__switches}
+        finally:
+            self.__lock.release()
+
+    def process_input(self, evt):
+        if self.__switchKey in evt.keysDown:
+            self.focus_next()
+            return True
+        return False
+
+    def _send_frame(self, screen, data, force):
+        '''Stores a frame of a screen and shows it if visible.
+
+        @return Whether the screen is visible.
+
+        '''
+        if len(data) != g19_frame.FRAME_SIZE:
+            raise ValueError("illegal frame size: " + str(len(data))
+                    + " should be 320x240x2=" + str(g19_frame.FRAME_SIZE))
+        if isinstance(data, g19_frame.FrameBuffer):
+            data = data.get_data_view()
+        self.__lock.acquire()
+        try:
+            screen._frame.set_data(data)
+            if screen is not self.__focused:
+                self.__framesHidden += 1
+                return False
+            self.__lg19.send_frame(screen._frame, force)
+            self.__framesShown += 1
+            return True
+        finally:
+            self.__lock.release()
+
+    def _send_region(self, screen, x, y, width, height, data):
+        '''Stores a window of a screen and shows it if visible.
+
+        @return Whether the screen is visible.
+
+        '''
+        if isinstance(data, list):
+            data = bytearray(val & 0xff for val in data)
+        self.__lock.acquire()
+        try:
+            g19_frame.insert_region(screen._frame.get_data_view(),
+                    x, y, width, height, data)
+            if screen is not self.__focused:
+                self.__framesHidden += 1
+                return False
+            self.__lg19.send_region(x, y, width, height, data)
+            self.__framesShown += 1
+            return True
+        finally:
+            self.__lock.release()
@@ -0,0 +1,355 @@
+import PIL.Image as Img
+import PIL.ImageChops as ImgChops
+import ctypes
+import mmap
+import struct
+
+# display geometry
+WIDTH = 320
+HEIGHT = 240
+
+# size of a frame's pixel payload in bytes (16bit highcolor per pixel)
+FRAME_SIZE = WIDTH * HEIGHT * 2
+
+# size of the protocol header preceding each transfer of pixel data
+HEADER_SIZE = 512
+
+
+def make_header(x=0, y=0, width=WIDTH, height=HEIGHT):
+    '''Creates the protocol header for writing pixels to a display window.
+
+    Layout of the first 16 bytes (values are little-endian):
+        0..1    0x10 0x0F
+        2..5    size of the following pixel data in bytes
+        6       0x00
+        7..8    first column
+        9..10   first row
+        11..12  last column
+        13..14  last row
+        15      0x0F
+    The remaining bytes are just a counting pattern.
+
+    @return Header as bytearray of HEADER_SIZE bytes.
+
+    '''
+    _check_window(x, y, width, height)
+    header = bytearray(struct.pack('<BBIBHHHHB', 0x10, 0x0F,
+            width * height * 2, 0x00,
+            x, y, x + width - 1, y + height - 1, 0x0F))
+    header += bytearray(range(16, 256) + range(256))
+    return header
+
+
+def _check_window(x, y, width, height):
+    '''Raises ValueError if given window is not completely on the display.'''
+    if width < 1 or height < 1 or x < 0 or y < 0 or \
+            x + width > WIDTH or y + height > HEIGHT:
+        raise ValueError("illegal display window: ({0}, {1}) {2}x{3}".format(
+                x, y, width, height))
+
+
+# Every frame sent to the display is preceded by this header.
+FRAME_HEADER = make_header()
+
+
+# Lookup tables for splitting 8bit color channels into the two bytes of a
+# 5-6-5 pixel.  The device expects each pixel in little-endian, so the first
+# byte is (gggbbbbb) and the second one (rrrrrggg).  The tables produce values
+# whose bits never overlap, so adding two channels equals OR-ing them.
+_LOW_GREEN = [((v >> 2) & 0x07) << 5 for v in range(256)]
+_LOW_BLUE = [v >> 3 for v in range(256)]
+_HIGH_RED = [(v >> 3) << 3 for v in range(256)]
+_HIGH_GREEN = [v >> 5 for v in range(256)]
+
+
+def _image_bytes(img):
+    '''Returns the raw data of given image as string.
+
+    Old PIL versions only know tostring(), newer ones only tobytes().
+
+    '''
+    if hasattr(img, 'tobytes'):
+        return img.tobytes()
+    return img.tostring()
+
+
+def _to_rgb_image(source):
+    '''Creates a PIL RGB image of display size from given source.
+
+    @param source A PIL image, a filename, or an array object exporting the
+    array interface (e.g. a numpy array of shape (240, 320, 3)).
+    @return PIL image in mode RGB having size 320x240.
+
+    '''
+    if isinstance(source, basestring):
+        img = Img.open(source)
+    elif isinstance(source, Img.Image):
+        img = source
+    else:
+        img = Img.fromarray(source)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if img.size != (WIDTH, HEIGHT):
+        img = img.resize((WIDTH, HEIGHT), Img.BICUBIC)
+    return img
+
+
+def image_to_frame(source, frameBuffer=None):
+    '''Converts an image to frame data ready to be sent to the display.
+
+    Resizing, conversion to 16bit highcolor (5-6-5) and reordering to the
+    column-major layout of the display (pixel (x, y) at x * 240 + y) are all
+    done by PIL in native code; no Python code is run per pixel.
+
+    The result is bit-identical to what G19.rgb_to_uint16() based conversion
+    puts on the wire.
+
+    @param source A PIL image, a filename, or an array object exporting the
+    array interface.  Images not having 320x240 pixels will be resized.
+    @param frameBuffer If given, the frame is written into this FrameBuffer
+    instead of a new bytearray.
+    @return Frame data as bytearray of 320x240x2 bytes, or frameBuffer if one
+    was given.
+
+    '''
+    img = _to_rgb_image(source)
+    # transposing makes the row-major raw data column-major
+    img = img.transpose(Img.TRANSPOSE)
+    r, g, b = img.split()
+    low = ImgChops.add(g.point(_LOW_GREEN), b.point(_LOW_BLUE))
+    high = ImgChops.add(r.point(_HIGH_RED), g.point(_HIGH_GREEN))
+    data = _image_bytes(Img.merge('LA', (low, high)))
+    if frameBuffer is not None:
+        frameBuffer.set_data(data)
+        return frameBuffer
+    return bytearray(data)
+
+
+class FrameBuffer(object):
+    '''A complete display frame: protocol header followed by pixel data.
+
+    The buffer is allocated once and can be sent by G19.send_frame() as it is,
+    so producers writing their pixels in place via get_data_view() cause no
+    allocations per frame.
+
+    This class is NOT thread-safe.
+
+    '''
+
+    def __init__(self, data=None):
+        '''Creates a frame buffer.
+
+        @param data Initial pixel data (see set_data()).  If None, the frame
+        will be black.
+
+        '''
+        self.__buffer = bytearray(HEADER_SIZE + FRAME_SIZE)
+        self.__buffer[:HEADER_SIZE] = FRAME_HEADER
+        self.__dataView = memoryview(self.__buffer)[HEADER_SIZE:]
+        if data is not None:
+            self.set_data(data)
+
+    def __len__(self):
+        return FRAME_SIZE
+
+    def fill(self, valueL, valueH):
+        '''Sets all pixels to the 16bit highcolor value (valueL, valueH).'''
+        self.__dataView[:] = bytearray((valueL, valueH)) * (WIDTH * HEIGHT)
+
+    def get_buffer(self):
+        '''Returns the whole frame including its header.
+
+        This is what gets sent to the display.
+
+        '''
+        return self.__buffer
+
+    def get_data_view(self):
+        '''Returns a writable memoryview of the pixel data.
+
+        The layout is the same as for G19.send_frame().
+
+        '''
+        return self.__dataView
+
+    def set_data(self, data):
+        '''Copies given pixel data into this frame.
+
+        @param data 320x240x2 bytes as str, bytearray, memoryview or list of
+        ints.  List items are truncated to their low byte, as the USB layer
+        would do.
+
+        '''
+        if len(data) != FRAME_SIZE:
+            raise ValueError("illegal frame size: " + str(len(data))
+                    + " should be 320x240x2=" + str(FRAME_SIZE))
+        if isinstance(data, list):
+            data = bytearray(val & 0xff for val in data)
+        self.__buffer[HEADER_SIZE:] = data
+
+
+class FrameArena(object):
+    '''Fixed number of frames stored in one contiguous block of memory.
+
+    Frames are accessed as memoryviews of their pixel data, which can be
+    given to G19.send_frame() as they are.  Compared to one object per frame,
+    this avoids the per-object overhead and keeps the memory of all frames in
+    one allocation, which can be an anonymous memory map.  The memory is
+    released when neither the arena nor any of its frames are referenced
+    anymore.
+
+    This class is NOT thread-safe.
+
+    '''
+
+    def __init__(self, count, useMmap=False):
+        '''Creates an arena of black frames.
+
+        @param count Number of frames.
+        @param useMmap Whether to allocate the memory as anonymous memory map
+        instead of a bytearray.
+
+        '''
+        size = count * FRAME_SIZE
+        self.__count = count
+        if useMmap:
+            # mmap objects do not support memoryview() in Python 2; the ctypes
+            # array keeps the map alive
+            storage = (ctypes.c_char * size).from_buffer(
+                    mmap.mmap(-1, size))
+        else:
+            storage = bytearray(size)
+        self.__view = memoryview(storage)
+
+    def __len__(self):
+        return self.__count
+
+    def get_frame(self, index):
+        '''Returns a writable memoryview of the pixel data of a frame.'''
+        if not 0 <= index < self.__count:
+            raise IndexError("frame index out of range: " + str(index))
+        start = index * FRAME_SIZE
+        return self.__view[start:start + FRAME_SIZE]
+
+    def set_frame(self, index, data):
+        '''Copies pixel data into a frame.
+
+        @param data Pixel data as described in FrameBuffer.set_data().
+
+        '''
+        if len(data) != FRAME_SIZE:
+            raise ValueError("illegal frame size: " + str(len(data))
+                    + " should be 320x240x2=" + str(FRAME_SIZE))
+        if isinstance(data, list):
+            data = bytearray(val & 0xff for val in data)
+        self.get_frame(index)[:] = data
+
+
+def extract_region(data, x, y, width, height):
+    '''Copies the pixels of a display window out of a complete frame.
+
+    @param data Frame data as described in G19.send_frame().
+    @return Pixel data of the window as bytearray, laid out column-major like
+    a complete frame.
+
+    '''
+    _check_window(x, y, width, height)
+    columnSize = height * 2
+    region = bytearray(width * columnSize)
+    for i in range(width):
+        start = 2 * ((x + i) * HEIGHT + y)
+        region[i * columnSize:(i + 1) * columnSize] = \
+                data[start:start + columnSize]
+    return region
+
+
+def insert_region(data, x, y, width, height, region):
+    '''Copies the pixels of a display window into a complete frame.
+
+    This is the reverse of extract_region().
+
+    @param data Writable frame data (bytearray or memoryview).
+    @param region Pixel data of the window, laid out like a complete frame.
+
+    '''
+    _check_window(x, y, width, height)
+    columnSize = height * 2
+    if len(region) != width * columnSize:
+        raise ValueError("illegal region size: " + str(len(region))
+                + " should be {0}x{1}x2={2}".format(
+                        width, height, width * columnSize))
+    for i in range(width):
+        start = 2 * ((x + i) * HEIGHT + y)
+        data[start:start + columnSize] = \
+                region[i * columnSize:(i + 1) * columnSize]
+
+
+def _first_difference(old, new, lo, hi):
+    '''Returns the lowest index in [lo, hi) at which old and new differ.
+
+    There must be a difference in [lo, hi).
+
+    '''
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if old[lo:mid] == new[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    return lo
+
+
+def _last_difference(old, new, lo, hi):
+    '''Returns the highest index in [lo, hi) at which old and new differ.
+
+    There must be a difference in [lo, hi).
+
+    '''
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if old[mid:hi] == new[mid:hi]:
+            hi = mid
+        else:
+            lo = mid
+    return lo
+
+
+def find_dirty_regions(old, new, maxRegions=4):
+    '''Finds the display windows in which two frames differ.
+
+    Adjacent changed columns, and those separated by a single unchanged
+    column, are joined into one window spanning the changed rows of all of
+    them.  If this results in more than maxRegions windows, a single window
+    bounding all changes is returned.
+
+    @param old Previous frame data (str, bytearray or memoryview).
+    @param new Current frame data (str, bytearray or memoryview).
+    @param maxRegions Maximum number of windows to return.
+    @return List of windows as (x, y, width, height).  Empty if both frames are
+    equal.
+
+    '''
+    columnSize = HEIGHT * 2
+    # each region is [firstColumn, lastColumn, firstRow, lastRow]
+    regions = []
+    for x in range(WIDTH):
+        start = x * columnSize
+        end = start + columnSize
+        if old[start:end] == new[start:end]:
+            continue
+        firstRow = (_first_difference(old, new, start, end) - start) // 2
+        lastRow = (_last_difference(old, new, start, end) - start) // 2
+        if regions and x - regions[-1][1] <= 2:
+            region = regions[-1]
+            region[1] = x
+            region[2] = min(region[2], firstRow)
+            region[3] = max(region[3], lastRow)
+        else:
+            regions.append([x, x, firstRow, lastRow])
+
+    if len(regions) > maxRegions:
+        regions = [[regions[0][0], regions[-1][1],
+                min(region[2] for region in regions),
+                max(region[3] for region in regions)]]
+    return [(x0, y0, x1 - x0 + 1, y1 - y0 + 1)
+            for x0, x1, y0, y1 in regions]
@@ -0,0 +1,381 @@
+from frame_pacer import monotonic
+from runnable import Runnable
+
+import heapq
+import threading
+import traceback
+
+# traffic classes, ordered by priority (lowest value first)
+CONTROL = 0
+FRAME = 1
+
+CLASS_NAMES = {CONTROL: 'control', FRAME: 'frame'}
+
+
+class Future(object):
+    '''Result of an operation executed by G19IoScheduler.'''
+
+    def __init__(self):
+        self.__event = threading.Event()
+        self.__result = None
+        self.__exception = None
+        self.__cancelled = False
+        self.__callbacks = []
+        self.__callbackMutex = threading.Lock()
+
+    def add_done_callback(self, func):
+        '''Calls func(future) once the operation was executed or dropped.
+
+        If that happened already, func is called right away.  Otherwise it is
+        called by the thread completing the operation, which it must not
+        block.  Exceptions raised by func are printed.
+
+        '''
+        self.__callbackMutex.acquire()
+        try:
+            if not self.__event.is_set():
+                self.__callbacks.append(func)
+                return
+        finally:
+            self.__callbackMutex.release()
+        self.__call(func)
+
+    def cancelled(self):
+        '''Returns whether the operation was dropped without being executed.'''
+        return self.__cancelled
+
+    def done(self):
+        '''Returns whether the operation was executed or dropped.'''
+        return self.__event.is_set()
+
+    def exception(self, timeout=None):
+        '''Waits for the operation and returns the exception it raised.
+
+        @param timeout Maximum time to wait in seconds, or None to wait
+        forever.
+        @return Exception raised by the operation, or None.
+
+        '''
+        self.__wait(timeout)
+        return self.__exception
+
+    def result(self, timeout=None):
+        '''Waits for the operation and returns its result.
+
+        If the operation raised an exception, it will be raised again here.
+
+        @param timeout Maximum time to wait in seconds, or None to wait
+        forever.
+        @return Return value of the operation, or None if it was dropped.
+
+        '''
+        self.__wait(timeout)
+        if self.__exception is not None:
+            raise self.__exception
+        return self.__result
+
+    def set_cancelled(self):
+        '''Marks the operation as dropped.  Used by G19IoScheduler.'''
+        self.__cancelled = True
+        self.__complete()
+
+    def set_exception(self, exception):
+        '''Sets the exception raised.  Used by G19IoScheduler.'''
+        self.__exception = exception
+        self.__complete()
+
+    def set_result(self, result):
+        '''Sets the result of the operation.  Used by G19IoScheduler.'''
+        self.__result = result
+        self.__complete()
+
+    def __call(self, func):
+        try:
+            func(self)
+        except Exception:
+            traceback.print_exc()
+
+    def __complete(self):
+        self.__callbackMutex.acquire()
+        try:
+            self.__event.set()
+            callbacks = self.__callbacks
+            self.__callbacks = []
+        finally:
+            self.__callbackMutex.release()
+        for func in callbacks:
+            self.__call(func)
+
+    def __wait(self, timeout):
+        self.__event.wait(timeout)
+        if not self.__event.is_set():
+            raise RuntimeError("operation did not complete within {0} s"
+                    .format(timeout))
+
+
+class G19IoScheduler(Runnable):
+    '''Executes all USB operations of a G19 on one thread.
+
+    Pending CONTROL operations are executed before FRAME operations.  Frames
+    given to submit_frame() do not queue up: only the latest one is kept, a
+    frame still waiting for transmission is dropped.  Operations given to
+    submit_latest() are coalesced the same way per key, and can be limited
+    to a maximum rate per key (see set_rate_limit()).
+
+    The time each operation waited for execution is recorded per traffic
+    class (see get_statistics()).
+
+    '''
+
+    def __init__(self, lock=None):
+        '''Creates a scheduler.
+
+        @param lock Lock held while executing an operation.  Others may acquire
+        it to keep the scheduler from accessing the device.  If None, a new
+        lock will be used.
+
+        '''
+        Runnable.__init__(self)
+        if lock is None:
+            lock = threading.Lock()
+        self.__lock = lock
+        self.__condition = threading.Condition()
+        # heap of (trafficClass, sequence, submitTime, future, func, args);
+        # submitTime is a monotonic() time
+        self.__queue = []
+        self.__frame = None
+        # key -> pending request of submit_latest()
+        self.__latest = {}
+        # key -> minimum interval between executions in seconds
+        self.__intervals = {}
+        # key -> earliest monotonic() time of the next execution
+        self.__nextAllowed = {}
+        # key -> [executed, coalesced]
+        self.__latestStats = {}
+        self.__sequence = 0
+        self.__stats = {}
+        for trafficClass in CLASS_NAMES:
+            # [executed, total delay, maximum delay, dropped]
+            self.__stats[trafficClass] = [0, 0.0, 0.0, 0]
+
+    def execute(self):
+        self.__condition.acquire()
+        try:
+            while True:
+                request = self.__pop_request()
+                if request is not None:
+                    break
+                if self.is_about_to_stop():
+                    return
+                # only rate-limited operations wait with a timeout, which
+                # polls in Python 2
+                self.__condition.wait(self.__get_wait_time())
+            trafficClass, sequence, submitTime, future, func, args = request
+            delay = monotonic() - submitTime
+            stats = self.__stats[trafficClass]
+            stats[0] += 1
+            stats[1] += delay
+            stats[2] = max(stats[2], delay)
+        finally:
+            self.__condition.release()
+
+        exception = None
+        self.__lock.acquire()
+        try:
+            result = func(*args)
+        except Exception, e:
+            exception = e
+        finally:
+            self.__lock.release()
+        # done callbacks of the future run without the device locked
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def get_coalescing_statistics(self):
+        '''Returns how many operations given to submit_latest() were executed.
+
+        @return Dictionary mapping each key to a dictionary containing the
+        number of operations executed ('issued') and replaced by newer ones
+        before execution ('coalesced').
+
+        '''
+        self.__condition.acquire()
+        try:
+            return dict((key, {'issued': issued, 'coalesced': coalesced})
+                    for key, (issued, coalesced)
+                    in self.__latestStats.items())
+        finally:
+            self.__condition.release()
+
+    def get_lock(self):
+        '''Returns the lock held while executing an operation.'''
+        return self.__lock
+
+    def get_statistics(self):
+        '''Returns the queueing delays per traffic class.
+
+        @return Dictionary mapping 'control' and 'frame' to
+        dictionaries containing the number of executed operations ('count'),
+        their mean and maximum delay before execution in seconds ('meanDelay',
+        'maxDelay') and the number of operations dropped ('dropped').
+
+        '''
+        self.__condition.acquire()
+        try:
+            result = {}
+            for trafficClass, name in CLASS_NAMES.items():
+                count, totalDelay, maxDelay, dropped = \
+                        self.__stats[trafficClass]
+                result[name] = {
+                        'count': count,
+                        'meanDelay': totalDelay / count if count else 0.0,
+                        'maxDelay': maxDelay,
+                        'dropped': dropped}
+            return result
+        finally:
+            self.__condition.release()
+
+    def set_rate_limit(self, key, rate):
+        '''Limits how often operations given to submit_latest() are executed.
+
+        @param key Key the limit applies to.
+        @param rate Maximum number of executions per second, or None for no
+        limit.
+
+        '''
+        self.__condition.acquire()
+        try:
+            if rate is None:
+                self.__intervals.pop(key, None)
+            else:
+                self.__intervals[key] = 1.0 / rate
+            self.__condition.notify()
+        finally:
+            self.__condition.release()
+
+    def stop(self):
+        Runnable.stop(self)
+        self.__condition.acquire()
+        self.__condition.notifyAll()
+        self.__condition.release()
+
+    def submit(self, trafficClass, func, *args):
+        '''Schedules func(*args) for execution on the scheduler thread.
+
+        @param trafficClass CONTROL or FRAME.
+        @return Future for the result of the call.
+
+        '''
+        return self.__submit(trafficClass, func, args, False)
+
+    def submit_frame(self, func, *args):
+        '''Schedules func(*args) as the frame to transmit next.
+
+        A frame submitted before which is still pending will be dropped, its
+        Future gets cancelled.
+
+        @return Future for the result of the call.
+
+        '''
+        return self.__submit(FRAME, func, args, True)
+
+    def submit_latest(self, trafficClass, key, func, *args):
+        '''Schedules func(*args), replacing a pending operation of that key.
+
+        This is meant for operations setting a state, where only the latest
+        value matters.  A replaced operation is not executed; it keeps its
+        position in the queue and its Future, which is returned again and
+        done when the replacing operation was executed.
+
+        @param trafficClass CONTROL or FRAME.
+        @param key Hashable identifying the state set by the operation.
+        @return Future for the result of the call.
+
+        '''
+        self.__condition.acquire()
+        try:
+            stats = self.__latestStats.setdefault(key, [0, 0])
+            pending = self.__latest.get(key)
+            if pending is None:
+                self.__sequence += 1
+                request = (trafficClass, self.__sequence, monotonic(),
+                        Future(), func, args)
+            else:
+                stats[1] += 1
+                request = pending[:4] + (func, args)
+            self.__latest[key] = request
+            self.__condition.notify()
+        finally:
+            self.__condition.release()
+        return request[3]
+
+    def __get_wait_time(self):
+        '''Returns the time until a deferred operation becomes due, or None.
+
+        Must be called with the condition held.
+
+        '''
+        if not self.__latest:
+            return None
+        now = monotonic()
+        return max(0.0, min(self.__nextAllowed.get(key, now) - now
+                for key in self.__latest))
+
+    def __pop_request(self):
+        '''Removes the request to execute next from the pending ones.
+
+        Must be called with the condition held.
+
+        @return Request, or None if there is none or all are deferred by rate
+        limits.
+
+        '''
+        request = None
+        if self.__queue:
+            request = self.__queue[0]
+        # the pending frame keeps its order relative to other FRAME operations
+        if self.__frame is not None and \
+                (request is None or self.__frame[:2] < request[:2]):
+            request = self.__frame
+        now = monotonic()
+        latestKey = None
+        for key, pending in self.__latest.items():
+            if self.__nextAllowed.get(key, now) <= now and \
+                    (request is None or pending[:2] < request[:2]):
+                request = pending
+                latestKey = key
+
+        if request is None:
+            return None
+        if latestKey is not None:
+            del self.__latest[latestKey]
+            self.__latestStats[latestKey][0] += 1
+            if latestKey in self.__intervals:
+                self.__nextAllowed[latestKey] = \
+                        now + self.__intervals[latestKey]
+        elif request is self.__frame:
+            self.__frame = None
+        else:
+            heapq.heappop(self.__queue)
+        return request
+
+    def __submit(self, trafficClass, func, args, latestWins):
+        future = Future()
+        self.__condition.acquire()
+        try:
+            self.__sequence += 1
+            request = (trafficClass, self.__sequence, monotonic(), future,
+                    func, args)
+            if latestWins:
+                if self.__frame is not None:
+                    self.__frame[3].set_cancelled()
+                    self.__stats[FRAME][3] += 1
+                self.__frame = request
+            else:
+                heapq.heappush(self.__queue, request)
+            self.__condition.notify()
+        finally:
+            self.__condition.release()
+        return future
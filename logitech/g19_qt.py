@@ -1,86 +1,353 @@
 from PyQt4 import QtCore
 from PyQt4 import QtGui
+from frame_pacer import monotonic
+from g19_keys import Key
+import g19_frame
+
+import PIL.Image as Img
+import sys
+
+# display keys and the Qt keys QtAppletHost delivers for them; SETTINGS moves
+# the focus like Tab does, OK activates buttons and check boxes like Select
+# does (Return would only click default buttons of dialogs)
+DISPLAY_KEYS = {
+        Key.BACK: QtCore.Qt.Key_Escape,
+        Key.DOWN: QtCore.Qt.Key_Down,
+        Key.LEFT: QtCore.Qt.Key_Left,
+        Key.MENU: QtCore.Qt.Key_Menu,
+        Key.OK: QtCore.Qt.Key_Select,
+        Key.RIGHT: QtCore.Qt.Key_Right,
+        Key.SETTINGS: QtCore.Qt.Key_Tab,
+        Key.UP: QtCore.Qt.Key_Up}
+
+
+def _display_pixels(img):
+    '''Returns the pixels of a QImage as PIL image in display format.
+
+    Format_RGB16 is the pixel format of the display, so images of that
+    format and display size are not converted pixel by pixel: their raw bits
+    are handed to PIL without copying them.  Other images are converted to
+    that format and size by Qt first.
+
+    @return (pixels, image): pixels is a PIL image in mode 'LA' having size
+    320x240, the two bytes of each pixel being the little-endian 16bit
+    highcolor value.  It refers to the memory of the QImage image, which
+    may be a converted copy of img; keep image until pixels are not used
+    anymore.
+
+    '''
+    if img.width() != g19_frame.WIDTH or img.height() != g19_frame.HEIGHT:
+        img = img.scaled(g19_frame.WIDTH, g19_frame.HEIGHT,
+                QtCore.Qt.IgnoreAspectRatio, QtCore.Qt.SmoothTransformation)
+    if img.format() != QtGui.QImage.Format_RGB16:
+        img = img.convertToFormat(QtGui.QImage.Format_RGB16)
+    bits = img.constBits()
+    bits.setsize(img.byteCount())
+    # each pixel is a native 16bit value; as 'LA' its two bytes stay as they
+    # are, which is what the display expects on little-endian machines
+    pixels = Img.frombuffer('LA', (g19_frame.WIDTH, g19_frame.HEIGHT), bits,
+            'raw', 'LA', img.bytesPerLine(), 1)
+    if sys.byteorder != 'little':
+        pixels = Img.merge('LA', pixels.split()[::-1])
+    return pixels, img
+
+
+def _column_major_bytes(pixels):
+    '''Returns the data of a PIL image transposed, i.e. column by column.'''
+    pixels = pixels.transpose(Img.TRANSPOSE)
+    if hasattr(pixels, 'tobytes'):
+        return pixels.tobytes()
+    return pixels.tostring()
+
+
+def qimage_to_frame(img, frameBuffer=None):
+    '''Converts a QImage to frame data ready to be sent to the display.
+
+    The pixels are transposed to the column-major layout of the display in a
+    single native call, see _display_pixels() for the conversion.
+
+    @param img QImage to convert.
+    @param frameBuffer If given, the frame is written into this FrameBuffer
+    instead of a new bytearray.
+    @return Frame data as bytearray of 320x240x2 bytes, or frameBuffer if one
+    was given.
+
+    '''
+    pixels, image = _display_pixels(img)
+    data = _column_major_bytes(pixels)
+    if frameBuffer is not None:
+        frameBuffer.set_data(data)
+        return frameBuffer
+    return bytearray(data)
+
+
+def qimage_to_region(img, x, y, width, height):
+    '''Converts a window of a QImage to data for G19.send_region().
+
+    @param img QImage to convert, see qimage_to_frame().
+    @return Pixel data of the window as bytearray.
+
+    '''
+    pixels, image = _display_pixels(img)
+    pixels = pixels.crop((x, y, x + width, y + height))
+    return bytearray(_column_major_bytes(pixels))
 
 
 def convert_image(img):
-    data = [0] * (320 * 240 * 2)
-    for x in range(320):
-        for y in range(240):
-            val = img.pixel(x, y)
-            data[2*(x * 240 + y)] = val >> 8
-            data[2*(x * 240 + y) + 1] = val & 0xff
-    return data
+    '''Converts a QImage to frame data, see qimage_to_frame().'''
+    return qimage_to_frame(img)
+
+
+class QtDisplay(object):
+    '''Shows Qt-rendered content on the display of a G19.
+
+    Images and widgets are converted into a FrameBuffer allocated once, which
+    is then sent without further copies.
+
+    This class is NOT thread-safe.
+
+    '''
+
+    def __init__(self, lg19):
+        '''Creates a display.
+
+        @param lg19 G19 to show content on.
+
+        '''
+        self.__lg19 = lg19
+        self.__frameBuffer = g19_frame.FrameBuffer()
+        self.__image = QtGui.QImage(g19_frame.WIDTH, g19_frame.HEIGHT,
+                QtGui.QImage.Format_RGB16)
+
+    def get_image(self):
+        '''Returns the QImage render_widget() paints into.
+
+        It can as well be painted by the caller and shown via show_image().
+
+        '''
+        return self.__image
+
+    def render_widget(self, widget):
+        '''Renders a widget including its children and shows the result.
+
+        Qt must use the raster graphics system.
+
+        '''
+        widget.render(self.__image)
+        self.show_image(self.__image)
+
+    def show_image(self, img):
+        '''Shows a QImage, see qimage_to_frame().'''
+        qimage_to_frame(img, self.__frameBuffer)
+        self.__lg19.send_frame(self.__frameBuffer)
+
+
+class QtAppletHost(QtCore.QObject):
+    '''Shows a widget tree on the display and feeds it with display keys.
+
+    The widget is shown offscreen.  Paint events Qt generates for widgets
+    needing a repaint are not executed, but collected as damage; on the next
+    flush only the damaged areas are rendered, so only the widgets touching
+    them paint, and only their pixels are sent via G19.send_region().  If
+    nothing repaints, nothing is rendered or sent, so an idle host costs no
+    CPU time.
+
+    Display keys are delivered to the focus widget as key events, see
+    DISPLAY_KEYS.  The widget becomes the active window then, as Qt neither
+    moves the focus nor draws it in inactive windows.
+
+    Except for process_input(), methods must be called from the thread of the
+    widgets.
+
+    '''
+
+    # delivers (Qt key, pressed) to the thread of the widgets
+    _keyReceived = QtCore.pyqtSignal(int, bool)
+
+    def __init__(self, lg19, widget, keyMap=None, maxFps=25, maxRegions=4):
+        '''Starts showing a widget.
+
+        @param lg19 G19 to show the widget on.
+        @param widget Top-level widget, which will be resized to 320x240.
+        @param keyMap Dictionary mapping G19 keys to the Qt keys delivered for
+        them.  If None, DISPLAY_KEYS will be used.
+        @param maxFps Maximum number of updates sent per second.
+        @param maxRegions Maximum number of windows sent per update.  If more
+        areas are damaged, the window bounding them will be sent.
+
+        '''
+        QtCore.QObject.__init__(self)
+        self.__display = QtDisplay(lg19)
+        self.__lg19 = lg19
+        self.__widget = widget
+        self.__keyMap = DISPLAY_KEYS if keyMap is None else keyMap
+        self.__minInterval = 1.0 / maxFps
+        self.__maxRegions = maxRegions
+        self.__nextFlush = 0.0
+        self.__flushScheduled = False
+        self.__rendering = False
+        self.__firstFlush = True
+        self.__damage = QtGui.QRegion()
+        self.__paintEvents = 0
+        self.__flushes = 0
+        self.__regionsSent = 0
+        self.__framesSent = 0
+        self.__pixelsSent = 0
+        self._keyReceived.connect(self.__deliver_key)
+
+        widget.resize(g19_frame.WIDTH, g19_frame.HEIGHT)
+        self.__watch(widget)
+        widget.setAttribute(QtCore.Qt.WA_DontShowOnScreen)
+        widget.show()
+        self.__add_damage(QtGui.QRegion(widget.rect()))
 
+    def eventFilter(self, obj, event):
+        eventType = event.type()
+        if eventType == QtCore.QEvent.ChildAdded:
+            child = event.child()
+            if child.isWidgetType():
+                self.__watch(child)
+        elif eventType == QtCore.QEvent.Paint and not self.__rendering:
+            self.__paintEvents += 1
+            region = event.region()
+            if obj is not self.__widget:
+                region = region.translated(
+                        obj.mapTo(self.__widget, QtCore.QPoint(0, 0)))
+            self.__add_damage(region)
+            # painted later, if still visible then
+            return True
+        return False
 
-QtGui.QApplication.setGraphicsSystem("raster");
-app = QtGui.QApplication(["-graphicssystem", "raster"])
-img = QtGui.QImage(320, 240, QtGui.QImage.Format_RGB16)
+    def flush(self):
+        '''Renders the damaged areas and sends them to the display.
 
-class Fuck(QtGui.QWidget):
+        Called automatically after damage occurred, at most maxFps times per
+        second.
 
-    def __init__(self):
-        QtGui.QWidget.__init__(self)
-        self.setAttribute(QtCore.Qt.WA_PaintOnScreen)
+        @return True if anything was sent.
 
-    def paintEngine(self):
-        return img.paintEngine()
+        '''
+        self.__flushScheduled = False
+        self.__nextFlush = monotonic() + self.__minInterval
+        damage = self.__damage.intersected(
+                QtGui.QRegion(self.__widget.rect()))
+        self.__damage = QtGui.QRegion()
+        if damage.isEmpty():
+            return False
+        self.__flushes += 1
 
-    #def paintEvent(self, evt):
-    #    evt.accept()
-    #    self.render(img)
+        rects = damage.rects()
+        if len(rects) > self.__maxRegions:
+            rects = [damage.boundingRect()]
+        image = self.__display.get_image()
+        self.__rendering = True
+        try:
+            for rect in rects:
+                self.__widget.render(image, rect.topLeft(),
+                        QtGui.QRegion(rect))
+        finally:
+            self.__rendering = False
 
-def logit(func):
-    def wrapped(*lols):
-        print "called"
-        return fund(*lols)
-    return wrapped
+        pixels = sum(rect.width() * rect.height() for rect in rects)
+        size = sum(g19_frame.HEADER_SIZE + rect.width() * rect.height() * 2
+                for rect in rects)
+        if self.__firstFlush or \
+                size >= g19_frame.HEADER_SIZE + g19_frame.FRAME_SIZE:
+            self.__firstFlush = False
+            self.__display.show_image(image)
+            self.__framesSent += 1
+            self.__pixelsSent += g19_frame.WIDTH * g19_frame.HEIGHT
+        else:
+            for rect in rects:
+                x, y, width, height = rect.getRect()
+                self.__lg19.send_region(x, y, width, height,
+                        qimage_to_region(image, x, y, width, height))
+            self.__regionsSent += len(rects)
+            self.__pixelsSent += pixels
+        return True
 
-#QtGui.QWidget.paintEngine = lambda a: img.paintEngine()
-w = QtGui.QWidget()
+    def get_input_processor(self):
+        return self
 
-#w = Fuck()
-w.resize(320,240)
-l = QtGui.QVBoxLayout(w)
-w.setLayout(l)
+    def get_statistics(self):
+        '''Returns how much work updating the display took.
 
-text1 = QtGui.QLabel("text1", w)
-l.addWidget(text1)
+        @return Dictionary containing the number of paint events turned into
+        damage ('paintEvents'), of flushes sending anything ('flushes'), of
+        windows ('regions') and complete frames ('frames') sent, and the number
+        of pixels sent ('pixels').
 
-text2 = QtGui.QLabel("text2", w)
-l.addWidget(text2)
+        '''
+        return {'paintEvents': self.__paintEvents,
+                'flushes': self.__flushes,
+                'regions': self.__regionsSent,
+                'frames': self.__framesSent,
+                'pixels': self.__pixelsSent}
 
-button1 = QtGui.QPushButton("Push me now", w)
-l.addWidget(button1)
+    def process_input(self, evt):
+        '''Delivers display keys to the widgets.  Thread-safe.'''
+        processed = False
+        for keys, pressed in [(evt.keysDown, True), (evt.keysUp, False)]:
+            for key in keys:
+                if key in self.__keyMap:
+                    self._keyReceived.emit(self.__keyMap[key], pressed)
+                    processed = True
+        return processed
 
-button2 = QtGui.QPushButton("Cancel this shit", w)
-l.addWidget(button2)
+    def __add_damage(self, region):
+        self.__damage = self.__damage.united(region)
+        if not self.__flushScheduled:
+            self.__flushScheduled = True
+            delay = max(0.0, self.__nextFlush - monotonic())
+            QtCore.QTimer.singleShot(int(delay * 1000), self.flush)
 
-w.render(img)
-data = convert_image(img)
+    @QtCore.pyqtSlot(int, bool)
+    def __deliver_key(self, key, pressed):
+        if pressed:
+            eventType = QtCore.QEvent.KeyPress
+        else:
+            eventType = QtCore.QEvent.KeyRelease
+        if QtGui.QApplication.activeWindow() is not self.__widget:
+            QtGui.QApplication.setActiveWindow(self.__widget)
+        target = self.__widget.focusWidget() or self.__widget
+        QtGui.QApplication.sendEvent(target,
+                QtGui.QKeyEvent(eventType, key, QtCore.Qt.NoModifier))
 
-from logitech.g19 import G19
-lg19 = G19()
-lg19.reset()
+    def __watch(self, widget):
+        '''Installs the damage tracking on a widget and its descendants.'''
+        widget.installEventFilter(self)
+        for child in widget.findChildren(QtGui.QWidget):
+            child.installEventFilter(self)
 
-lg19 = G19()
-lg19.send_frame(data)
 
-evtDownPress = QtGui.QKeyEvent(QtCore.QEvent.KeyPress, QtCore.Qt.Key_Down, QtCore.Qt.NoModifier)
-evtDownRelease = QtGui.QKeyEvent(QtCore.QEvent.KeyRelease, QtCore.Qt.Key_Down, QtCore.Qt.NoModifier)
+def main():
+    from g19 import G19
 
-QtCore.QCoreApplication.postEvent(w, evtDownPress)
-QtCore.QCoreApplication.postEvent(w, evtDownRelease)
+    QtGui.QApplication.setGraphicsSystem("raster")
+    app = QtGui.QApplication(["-graphicssystem", "raster"])
 
-w.render(img)
-data = convert_image(img)
+    w = QtGui.QWidget()
+    w.resize(320, 240)
+    l = QtGui.QVBoxLayout(w)
+    w.setLayout(l)
+    l.addWidget(QtGui.QLabel("text1", w))
+    l.addWidget(QtGui.QLabel("text2", w))
+    l.addWidget(QtGui.QPushButton("Push me now", w))
+    l.addWidget(QtGui.QPushButton("Cancel", w))
 
-evtDownPress = QtGui.QKeyEvent(QtCore.QEvent.KeyPress, QtCore.Qt.Key_Tab, QtCore.Qt.NoModifier)
-evtDownRelease = QtGui.QKeyEvent(QtCore.QEvent.KeyRelease, QtCore.Qt.Key_Tab, QtCore.Qt.NoModifier)
+    lg19 = G19()
+    host = QtAppletHost(lg19, w)
+    lg19.add_applet(host)
+    lg19.start_event_handling()
+    try:
+        app.exec_()
+    finally:
+        lg19.stop_event_handling()
 
-QtCore.QCoreApplication.postEvent(w, evtDownPress)
-QtCore.QCoreApplication.postEvent(w, evtDownRelease)
+if __name__ == '__main__':
+    main()
 
 
-# Xvfb :1 -screen 0 320x240x16 -fbdir /tmp/lala 
+# Xvfb :1 -screen 0 320x240x16 -fbdir /tmp/lala
 # xwud -in /tmp/lala/Xvfb_screen0
 # xwdtopnm
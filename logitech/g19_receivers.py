@@ -1,8 +1,127 @@
 from g19_keys import (Data, Key)
 from runnable import Runnable
 
+import Queue
 import threading
 import time
+import traceback
+
+# Time a key reader waits for data in one read (milliseconds).  This bounds
+# how long stopping the receiver takes, but also is the period in which idle
+# readers wake up.
+READ_TIMEOUT = 1000
+
+# Time to wait after a failed read before reading again (seconds).
+ERROR_DELAY = 0.1
+
+# Number of events waiting for an input processor before new ones get dropped.
+DISPATCH_QUEUE_SIZE = 64
+
+# Time an input processor may take for one event before it is reported as slow
+# (seconds).
+TIME_BUDGET = 0.05
+
+
+def _key_mask(keys):
+    '''Returns the bitmask having bit (1 << key) set for all given keys.'''
+    mask = 0
+    for key in keys:
+        mask |= 1 << key
+    return mask
+
+
+def _build_keys_table(keyCodes, shift):
+    '''Creates a table mapping each value of one byte of a key packet to the
+    keys pressed according to it.
+
+    @param keyCodes Dictionary mapping key codes to keys, like Data.gmKeys.
+    @param shift Position of the byte in the packet's key codes in bits.
+    @return List of 256 key bitmasks, with None for values containing unknown
+    bits.
+
+    '''
+    table = []
+    for val in range(256):
+        code = val << shift
+        keys = []
+        knownBits = 0
+        for keyCode, key in keyCodes.items():
+            if keyCode & code == keyCode:
+                keys.append(key)
+                knownBits |= keyCode
+        table.append(_key_mask(keys) if knownBits == code else None)
+    return table
+
+
+# all G/M packets have this bit set
+_GM_EMPTY = 0x400000
+
+# key bitmasks for each of the three key bytes of a G/M packet
+_GM_KEYS_TABLES = [_build_keys_table(Data.gmKeys, shift)
+        for shift in (0, 8, 16)]
+
+# key bitmasks for all multimedia key packets [0x01, key]
+_MM_KEYS_TABLE = _build_keys_table(Data.mmKeys, 0)
+
+# key bitmasks for all display key packets [key, 0x80]
+_DISPLAY_KEYS_TABLE = _build_keys_table(Data.displayKeys, 0)
+
+# keys whose state is given by each kind of packet
+_GM_KEYS_MASK = _key_mask(Key.gmKeys)
+_DISPLAY_KEYS_MASK = _key_mask(Key.displayKeys)
+_WINKEY_SWITCH_MASK = _key_mask([Key.WINKEY_SWITCH])
+_MM_KEYS_MASK = _key_mask(Key.mmKeys) & ~_WINKEY_SWITCH_MASK
+
+# Already decoded G/M packets and key sets.  Only few combinations of keys
+# occur in practice, the limit just guards against filling memory with
+# garbage.
+_MEMO_SIZE = 1024
+_gmMaskMemo = {}
+_keySetMemo = {}
+
+
+def _decode_g_and_m(curVal):
+    '''Returns the keys pressed according to given G/M packet value.
+
+    @param curVal Key bytes of the packet as 24bit value.
+    @return Bitmask of pressed keys, or None if the value is invalid.
+
+    '''
+    if not curVal & _GM_EMPTY:
+        return None
+    curVal ^= _GM_EMPTY
+    mask = 0
+    for table in _GM_KEYS_TABLES:
+        byteMask = table[curVal & 0xff]
+        if byteMask is None:
+            return None
+        mask |= byteMask
+        curVal >>= 8
+    if curVal:
+        return None
+    return mask
+
+
+def _memoize(memo, key, value):
+    '''Stores value in given memo, emptying it first if it is full.'''
+    if len(memo) >= _MEMO_SIZE:
+        memo.clear()
+    memo[key] = value
+
+
+def keys_of_mask(mask):
+    '''Returns the keys whose bit (1 << key) is set in given bitmask.
+
+    @return frozenset of keys.
+
+    '''
+    keys = _keySetMemo.get(mask)
+    if keys is None:
+        keys = frozenset(key for key in range(mask.bit_length())
+                if mask >> key & 1)
+        _memoize(_keySetMemo, mask, keys)
+    return keys
+
 
 class InputProcessor(object):
     '''Object to process key presses.'''
@@ -23,6 +142,8 @@ class InputProcessor(object):
 class InputEvent(object):
     '''Event created by a key press or release.'''
 
+    __slots__ = ('oldState', 'newState', 'keysDown', 'keysUp')
+
     def __init__(self, oldState, newState, keysDown, keysUp):
         '''Creates an InputEvent.
 
@@ -39,100 +160,167 @@ class InputEvent(object):
 
 
 class State(object):
-    '''Current state of keyboard.'''
+    '''Current state of keyboard.
 
-    def __init__(self):
-        self.__keysDown = set()
+    The pressed keys are kept as bitmask having bit (1 << key) set for each
+    pressed key, so copying a state is cheap.
 
-    def _data_to_keys_g_and_m(self, data):
-        '''Converts a G/M keys data package to a set of keys defined as
+    '''
+
+    __slots__ = ('__keysDown',)
+
+    def __init__(self, keysDown=0):
+        '''Creates a state.
+
+        @param keysDown Bitmask of pressed keys.
+
+        '''
+        self.__keysDown = keysDown
+
+    def _data_to_mask_display(self, data):
+        '''Converts a display keys data package to the bitmask of keys
+        defined as pressed by it.
+
+        '''
+        if len(data) != 2 or data[1] != 0x80:
+            raise ValueError("not a display key packet: " + str(data))
+        mask = None
+        if 0 <= data[0] < len(_DISPLAY_KEYS_TABLE):
+            mask = _DISPLAY_KEYS_TABLE[data[0]]
+        if mask is None:
+            raise ValueError("incorrect display key packet: " + str(data))
+        return mask
+
+    def _data_to_mask_g_and_m(self, data):
+        '''Converts a G/M keys data package to the bitmask of keys defined as
         pressed by it.
 
         '''
         if len(data) != 4 or data[0] != 2:
             raise ValueError("not a multimedia key packet: " + str(data))
-        empty = 0x400000
         curVal = data[3] << 16 | data[2] << 8 | data[1]
-        keys = []
-        while curVal != empty:
-            foundAKey = False
-            for val in Data.gmKeys.keys():
-                if val & curVal == val:
-                    curVal ^= val
-                    keys.append(Data.gmKeys[val])
-                    foundAKey = True
-            if not foundAKey:
+        mask = _gmMaskMemo.get(curVal)
+        if mask is None:
+            mask = _decode_g_and_m(curVal)
+            if mask is None:
                 raise ValueError("incorrect g/m key packet: " +
                         str(data))
+            _memoize(_gmMaskMemo, curVal, mask)
+        return mask
 
-        return set(keys)
-
-    def _data_to_keys_mm(self, data):
-        '''Converts a multimedia keys data package to a set of keys defined as
-        pressed by it.
+    def _data_to_mask_mm(self, data):
+        '''Converts a multimedia keys data package to the bitmask of keys
+        defined as pressed by it.
 
         '''
         if len(data) != 2 or data[0] not in [1, 3]:
             raise ValueError("not a multimedia key packet: " + str(data))
         if data[0] == 1:
-            curVal = data[1]
-            keys = []
-            while curVal:
-                foundAKey = False
-                for val in Data.mmKeys.keys():
-                    if val & curVal == val:
-                        curVal ^= val
-                        keys.append(Data.mmKeys[val])
-                        foundAKey = True
-                if not foundAKey:
-                    raise ValueError("incorrect multimedia key packet: " +
-                            str(data))
+            mask = None
+            if 0 <= data[1] < len(_MM_KEYS_TABLE):
+                mask = _MM_KEYS_TABLE[data[1]]
+            if mask is None:
+                raise ValueError("incorrect multimedia key packet: " +
+                        str(data))
         elif data == [3, 1]:
-            keys = [Key.WINKEY_SWITCH]
+            mask = _WINKEY_SWITCH_MASK
         elif data == [3, 0]:
-            keys = []
+            mask = 0
         else:
             raise ValueError("incorrect multimedia key packet: " + str(data))
 
-        return set(keys)
+        return mask
+
+    def _data_to_keys_display(self, data):
+        '''Converts a display keys data package to a set of keys defined as
+        pressed by it.
+
+        @return frozenset of pressed keys.
+
+        '''
+        return keys_of_mask(self._data_to_mask_display(data))
+
+    def _data_to_keys_g_and_m(self, data):
+        '''Converts a G/M keys data package to a set of keys defined as
+        pressed by it.
+
+        @return frozenset of pressed keys.
+
+        '''
+        return keys_of_mask(self._data_to_mask_g_and_m(data))
+
+    def _data_to_keys_mm(self, data):
+        '''Converts a multimedia keys data package to a set of keys defined as
+        pressed by it.
+
+        @return frozenset of pressed keys.
+
+        '''
+        return keys_of_mask(self._data_to_mask_mm(data))
 
     def _update_keys_down(self, possibleKeys, keys):
-        '''Updates internal keysDown set.
+        '''Updates internal keysDown bitmask.
 
         Updates the current state of all keys in 'possibleKeys' with state
         given in 'keys'.
 
         Example:
-        Currently set as pressed in self.__keysDown: [A, B]
-        possibleKeys: [B, C, D]
-        keys: [C]
-
-        This would set self.__keysDown to [A, C] and return ([C], [B])
-
-        @param possibleKeys Keys whose state could be given as 'pressed' at the
-        same time by 'keys'.
-        @param keys Current state of all keys in possibleKeys.
-        @return A pair of sets listing newly pressed and newly released keys.
-
-        '''
-        keysDown = set()
-        keysUp = set()
-        for key in possibleKeys:
-            if key in keys:
-                if key not in self.__keysDown:
-                    self.__keysDown.add(key)
-                    keysDown.add(key)
-            else:
-                if key in self.__keysDown:
-                    self.__keysDown.remove(key)
-                    keysUp.add(key)
-        return (keysDown, keysUp)
+        Currently set as pressed in self.__keysDown: A|B
+        possibleKeys: B|C|D
+        keys: C
+
+        This would set self.__keysDown to A|C and return an InputEvent having
+        keysDown [C] and keysUp [B].
+
+        @param possibleKeys Bitmask of keys whose state could be given as
+        'pressed' at the same time by 'keys'.
+        @param keys Bitmask of current state of all keys in possibleKeys.
+        @return InputEvent listing newly pressed and newly released keys.
+
+        '''
+        oldKeys = self.__keysDown
+        newKeys = oldKeys & ~possibleKeys | keys & possibleKeys
+        self.__keysDown = newKeys
+        changed = oldKeys ^ newKeys
+        return InputEvent(State(oldKeys), State(newKeys),
+                keys_of_mask(changed & newKeys),
+                keys_of_mask(changed & oldKeys))
 
     def clone(self):
         '''Returns an exact copy of this state.'''
-        state = State()
-        state.__keysDown = set(self.__keysDown)
-        return state
+        return State(self.__keysDown)
+
+    def get_keys_down(self):
+        '''Returns all keys currently pressed.
+
+        @return frozenset of keys.
+
+        '''
+        return keys_of_mask(self.__keysDown)
+
+    def get_mask(self):
+        '''Returns the bitmask having bit (1 << key) set for each pressed
+        key.
+
+        '''
+        return self.__keysDown
+
+    def is_pressed(self, key):
+        '''Returns whether given key is currently pressed.'''
+        return bool(self.__keysDown >> key & 1)
+
+    def packet_received_display(self, data):
+        '''Mutates the state by given data packet from display keys.
+
+        @param data Data packet received.
+        @return InputEvent for data packet, or None if data packet was ignored.
+
+        '''
+        evt = None
+        if len(data) == 2 and data[1] == 0x80:
+            keys = self._data_to_mask_display(data)
+            evt = self._update_keys_down(_DISPLAY_KEYS_MASK, keys)
+        return evt
 
     def packet_received_g_and_m(self, data):
         '''Mutates the state by given data packet from G- and M- keys.
@@ -141,13 +329,10 @@ class State(object):
         @return InputEvent for data packet, or None if data packet was ignored.
 
         '''
-        oldState = self.clone()
         evt = None
         if len(data) == 4:
-            keys = self._data_to_keys_g_and_m(data)
-            keysDown, keysUp = self._update_keys_down(Key.gmKeys, keys)
-            newState = self.clone()
-            evt = InputEvent(oldState, newState, keysDown, keysUp)
+            keys = self._data_to_mask_g_and_m(data)
+            evt = self._update_keys_down(_GM_KEYS_MASK, keys)
         return evt
 
     def packet_received_mm(self, data):
@@ -157,24 +342,302 @@ class State(object):
         @return InputEvent for data packet.
 
         '''
-        oldState = self.clone()
         if len(data) != 2:
             raise ValueError("incorrect multimedia key packet: " + str(data))
-        keys = self._data_to_keys_mm(data)
-        winKeySet = set([Key.WINKEY_SWITCH])
+        keys = self._data_to_mask_mm(data)
         if data[0] == 1:
             # update state of all mm keys
-            possibleKeys = Key.mmKeys.difference(winKeySet)
-            keysDown, keysUp = self._update_keys_down(possibleKeys, keys)
+            return self._update_keys_down(_MM_KEYS_MASK, keys)
         else:
             # update winkey state
-            keysDown, keysUp = self._update_keys_down(winKeySet, keys)
-        newState = self.clone()
-        return InputEvent(oldState, newState, keysDown, keysUp)
+            return self._update_keys_down(_WINKEY_SWITCH_MASK, keys)
+
+
+class _Delivery(object):
+    '''An input event on its way to the input processors.
+
+    Keeps for each processor whether it is done with the event and whether it
+    consumed it, so later processors can tell if an earlier one did.
+
+    '''
+
+    __slots__ = ('evt', 'done', 'consumed')
+
+    def __init__(self, evt, count):
+        '''Creates a delivery.
+
+        @param evt InputEvent to deliver.
+        @param count Number of processors.
+
+        '''
+        self.evt = evt
+        self.done = [threading.Event() for i in range(count)]
+        self.consumed = [False] * count
+
+    def consumed_before(self, index):
+        '''Returns whether a processor before the given one consumed the
+        event.
+
+        Waits until all earlier processors are done with the event.
+
+        '''
+        for i in range(index):
+            self.done[i].wait()
+            if self.consumed[i]:
+                return True
+        return False
+
+    def set_verdict(self, index, consumed):
+        '''Records whether the processor at given index consumed the event.'''
+        self.consumed[index] = consumed
+        self.done[index].set()
+
+
+class _ProcessorWorker(Runnable):
+    '''Passes events to one input processor on its own thread.'''
+
+    def __init__(self, processor, queueSize, timeBudget):
+        Runnable.__init__(self)
+        self.__processor = processor
+        self.__queue = Queue.Queue(queueSize)
+        self.__timeBudget = timeBudget
+        self.__mutex = threading.Lock()
+        # set by stop(), guarded by the mutex
+        self.__stopping = False
+        # [events, consumed, dropped, slow, maximum time]
+        self.__stats = [0, 0, 0, 0, 0.0]
+
+    def execute(self):
+        item = self.__queue.get()
+        if item is None:
+            return
+        delivery, index = item
+        if delivery.consumed_before(index):
+            delivery.set_verdict(index, False)
+            return
+        start = time.time()
+        try:
+            consumed = bool(self.__processor.process_input(delivery.evt))
+        except Exception:
+            traceback.print_exc()
+            consumed = False
+        duration = time.time() - start
+        delivery.set_verdict(index, consumed)
+
+        self.__mutex.acquire()
+        self.__stats[0] += 1
+        if consumed:
+            self.__stats[1] += 1
+        if duration > self.__timeBudget:
+            self.__stats[3] += 1
+        self.__stats[4] = max(self.__stats[4], duration)
+        self.__mutex.release()
+        if duration > self.__timeBudget:
+            print "slow input processor {0}: {1:.0f} ms".format(
+                    self.__processor, 1000 * duration)
+
+    def get_processor(self):
+        return self.__processor
+
+    def get_statistics(self):
+        '''Returns the statistics of this worker.
+
+        @return See InputDispatcher.get_statistics().
+
+        '''
+        self.__mutex.acquire()
+        events, consumed, dropped, slow, maxTime = self.__stats
+        self.__mutex.release()
+        return {'processor': self.__processor,
+                'events': events,
+                'consumed': consumed,
+                'dropped': dropped,
+                'slow': slow,
+                'maxTime': maxTime}
+
+    def offer(self, delivery, index):
+        '''Queues a delivery if there is space left.
+
+        Once stopped, deliveries are withheld from this and all later
+        processors.
+
+        @param index Index of this worker's verdict in the delivery.
+        @return True if queued or withheld, False if dropped.
+
+        '''
+        self.__mutex.acquire()
+        try:
+            if self.__stopping:
+                delivery.set_verdict(index, True)
+                return True
+            try:
+                self.__queue.put_nowait((delivery, index))
+                return True
+            except Queue.Full:
+                self.__stats[2] += 1
+                return False
+        finally:
+            self.__mutex.release()
+
+    def start(self):
+        self.__mutex.acquire()
+        self.__stopping = False
+        self.__mutex.release()
+        Runnable.start(self)
+
+    def stop(self):
+        Runnable.stop(self)
+        # deliveries still queued are withheld, so later processors waiting
+        # for their verdicts do not wait forever
+        self.__mutex.acquire()
+        try:
+            self.__stopping = True
+            while True:
+                try:
+                    item = self.__queue.get_nowait()
+                except Queue.Empty:
+                    break
+                if item is not None:
+                    delivery, index = item
+                    delivery.set_verdict(index, True)
+            # wake up execute()
+            self.__queue.put_nowait(None)
+        finally:
+            self.__mutex.release()
+
+
+class InputDispatcher(object):
+    '''Passes input events to input processors, off the thread reading them.
+
+    Each processor gets its own thread and a bounded queue, and every event
+    is queued for all processors at once.  The first processor consuming an
+    event wins: a processor only gets an event after all processors added
+    before it are done with it, and only if none of them consumed it.  A
+    slow processor therefore delays the ones after it; processors taking
+    longer than the time budget for an event are counted and reported.  If
+    the queue of a processor is full, the event is dropped for that processor
+    only.
+
+    '''
+
+    def __init__(self, queueSize=DISPATCH_QUEUE_SIZE, timeBudget=TIME_BUDGET):
+        '''Creates a dispatcher.
+
+        @param queueSize Number of events that may wait for a processor.
+        @param timeBudget Time in seconds a processor may take for an event.
+
+        '''
+        self.__queueSize = queueSize
+        self.__timeBudget = timeBudget
+        self.__workers = ()
+        self.__threads = []
+        self.__running = False
+        self.__mutex = threading.Lock()
+
+    def add_processor(self, processor):
+        '''Adds an input processor.'''
+        worker = _ProcessorWorker(processor, self.__queueSize,
+                self.__timeBudget)
+        self.__mutex.acquire()
+        try:
+            self.__workers += (worker,)
+            if self.__running:
+                self.__start_worker(worker)
+        finally:
+            self.__mutex.release()
+
+    def dispatch(self, evt):
+        '''Queues evt for the input processors and returns immediately.'''
+        workers = self.__workers
+        delivery = _Delivery(evt, len(workers))
+        for index, worker in enumerate(workers):
+            if not worker.offer(delivery, index):
+                # later processors need not wait for this one
+                delivery.set_verdict(index, False)
+                print "input event dropped, {0} is busy".format(
+                        worker.get_processor())
+
+    def get_statistics(self):
+        '''Returns statistics about each input processor.
+
+        @return List of dictionaries, in order of the processors, containing
+        the processor ('processor'), the number of events it processed
+        ('events') and consumed ('consumed'), the number of events dropped
+        because its queue was full ('dropped'), the number of events it took
+        longer than the time budget for ('slow') and its maximum time for an
+        event in seconds ('maxTime').
+
+        '''
+        return [worker.get_statistics() for worker in self.__workers]
+
+    def start(self):
+        '''Starts the threads of all processors.'''
+        self.__mutex.acquire()
+        try:
+            self.__running = True
+            for worker in self.__workers:
+                self.__start_worker(worker)
+        finally:
+            self.__mutex.release()
+
+    def stop(self):
+        '''Stops the threads of all processors after their current event.'''
+        self.__mutex.acquire()
+        try:
+            self.__running = False
+            threads = self.__threads
+            self.__threads = []
+        finally:
+            self.__mutex.release()
+        for worker in self.__workers:
+            worker.stop()
+        for t in threads:
+            t.join()
+
+    def __start_worker(self, worker):
+        worker.start()
+        t = threading.Thread(target=worker.run)
+        self.__threads.append(t)
+        t.start()
+
+
+class _KeyReader(Runnable):
+    '''Reads packets from one interrupt endpoint into a queue.'''
+
+    def __init__(self, read, handler, queue):
+        '''Creates a reader.
+
+        @param read Function reading from the endpoint, taking a timeout in
+        milliseconds as keyword argument 'timeout' and returning the read data
+        or an empty list.
+        @param handler Function to put into the queue along with each packet.
+        @param queue Queue receiving (handler, packet) pairs.
+
+        '''
+        Runnable.__init__(self)
+        self.__read = read
+        self.__handler = handler
+        self.__queue = queue
+
+    def execute(self):
+        start = time.time()
+        data = self.__read(timeout=READ_TIMEOUT)
+        if data:
+            self.__queue.put((self.__handler, data))
+        elif time.time() - start < READ_TIMEOUT / 2000.0:
+            # the read failed instead of timing out, don't spin on errors
+            time.sleep(ERROR_DELAY)
 
 
 class G19Receiver(Runnable):
-    '''This receiver consumes all data sent by special keys.'''
+    '''This receiver consumes all data sent by special keys.
+
+    Each endpoint is read by its own thread blocking until data arrives.  All
+    packets are decoded in order of arrival by the thread calling run(), the
+    resulting events are passed to the input processors by an
+    InputDispatcher.
+
+    '''
 
     def __init__(self, g19):
         Runnable.__init__(self)
@@ -182,47 +645,29 @@ class G19Receiver(Runnable):
         self.__ips = []
         self.__mutex = threading.Lock()
         self.__state = State()
+        self.__queue = Queue.Queue()
+        self.__dispatcher = InputDispatcher()
 
     def add_input_processor(self, processor):
         '''Adds an input processor.'''
         self.__mutex.acquire()
         self.__ips.append(processor)
+        self.__dispatcher.add_processor(processor)
         self.__mutex.release()
         pass
 
     def execute(self):
-        gotData = False
-        processors = self.list_all_input_processors()
+        handler, data = self.__queue.get()
+        if handler:
+            handler(data)
 
-        data = self.__g19.read_multimedia_keys()
-        if data:
-            evt = self.__state.packet_received_mm(data)
-            if evt:
-                for proc in processors:
-                    if proc.process_input(evt):
-                        break
-            else:
-                print "mm ignored: ", data
-            gotData = True
-
-        data = self.__g19.read_g_and_m_keys()
-        if data:
-            evt = self.__state.packet_received_g_and_m(data)
-            if evt:
-                for proc in processors:
-                    if proc.process_input(evt):
-                        break
-            else:
-                print "m/g ignored: ", data
-            gotData = True
-
-        data = self.__g19.read_display_menu_keys()
-        if data:
-            print "dis: ", data
-            gotData = True
+    def get_dispatch_statistics(self):
+        '''Returns statistics about each input processor.
+
+        @return See InputDispatcher.get_statistics().
 
-        if not gotData:
-            time.sleep(0.03)
+        '''
+        return self.__dispatcher.get_statistics()
 
     def list_all_input_processors(self):
         '''Returns a list of all input processors currently registered to this
@@ -236,3 +681,53 @@ class G19Receiver(Runnable):
         allProcessors = list(self.__ips)
         self.__mutex.release()
         return allProcessors
+
+    def run(self):
+        readers = [
+                _KeyReader(self.__g19.read_multimedia_keys,
+                        self.__process_multimedia_keys, self.__queue),
+                _KeyReader(self.__g19.read_g_and_m_keys,
+                        self.__process_g_and_m_keys, self.__queue),
+                _KeyReader(self.__g19.read_display_menu_keys,
+                        self.__process_display_menu_keys, self.__queue)]
+        self.__dispatcher.start()
+        threads = []
+        for reader in readers:
+            reader.start()
+            t = threading.Thread(target=reader.run)
+            threads.append(t)
+            t.start()
+        try:
+            Runnable.run(self)
+        finally:
+            for reader in readers:
+                reader.stop()
+            for t in threads:
+                t.join()
+            self.__dispatcher.stop()
+
+    def stop(self):
+        Runnable.stop(self)
+        # wake up run()
+        self.__queue.put((None, None))
+
+    def __process_display_menu_keys(self, data):
+        evt = self.__state.packet_received_display(data)
+        if evt:
+            self.__dispatcher.dispatch(evt)
+        else:
+            print "dis ignored: ", data
+
+    def __process_g_and_m_keys(self, data):
+        evt = self.__state.packet_received_g_and_m(data)
+        if evt:
+            self.__dispatcher.dispatch(evt)
+        else:
+            print "m/g ignored: ", data
+
+    def __process_multimedia_keys(self, data):
+        evt = self.__state.packet_received_mm(data)
+        if evt:
+            self.__dispatcher.dispatch(evt)
+        else:
+            print "mm ignored: ", data
@@ -0,0 +1,445 @@
+'''Simulated G19 for running the daemon without the keyboard attached.
+
+SimulatedG19UsbController can be given to G19 instead of a
+G19UsbController:
+
+    >>> device = SimulatedG19UsbController()
+    >>> lg19 = G19(usbDevice=device)
+
+Transfers take as long as the bus model (UsbBusModel) says, key packets can
+be scripted (SimulatedG19UsbController.feed_packet(), play()) and every
+frame and control message sent is captured.  The device can be unplugged and
+plugged in again (unplug(), plug()).
+
+'''
+import collections
+import os
+import select
+import threading
+import time
+import usb
+
+# endpoints of the G19, see G19UsbController
+EP_LCD = 0x02
+EP_DISPLAY_KEYS = 0x81
+EP_MULTIMEDIA_KEYS = 0x82
+EP_G_KEYS = 0x83
+
+# error message of pyusb for transfers to a device which is gone
+DEVICE_LOST_MESSAGE = "No such device (it may have been disconnected)"
+
+
+class UsbBusModel(object):
+    '''Timing model of the USB bus the G19 is attached to.
+
+    Only one transfer is on the bus at a time.  A transfer of n bytes
+    occupies it for latency + n / throughput seconds.
+
+    '''
+
+    def __init__(self, throughput=1.0e6, latency=0.001):
+        '''Creates a bus model.
+
+        @param throughput Payload bytes transferred per second.  The defaults
+        approximate a full-speed device.
+        @param latency Fixed time per transfer in seconds.
+
+        '''
+        self.__throughput = float(throughput)
+        self.__latency = latency
+        self.__lock = threading.Lock()
+        self.__busyTime = 0.0
+        self.__bytes = 0
+        self.__transfers = 0
+
+    def get_statistics(self):
+        '''Returns the bus usage.
+
+        @return Dictionary containing the number of transfers ('transfers'),
+        the bytes transferred ('bytes') and the time the bus was occupied in
+        seconds ('busyTime').
+
+        '''
+        self.__lock.acquire()
+        try:
+            return {'transfers': self.__transfers,
+                    'bytes': self.__bytes,
+                    'busyTime': self.__busyTime}
+        finally:
+            self.__lock.release()
+
+    def transfer(self, size, timeout):
+        '''Occupies the bus for a transfer of size bytes.
+
+        @param timeout Maximum time the transfer may take in milliseconds.
+        @return Whether the transfer completed within timeout.
+
+        '''
+        duration = self.transfer_time(size)
+        completed = duration <= timeout / 1000.0
+        if not completed:
+            duration = timeout / 1000.0
+        self.__lock.acquire()
+        try:
+            time.sleep(duration)
+            self.__busyTime += duration
+            self.__transfers += 1
+            if completed:
+                self.__bytes += size
+        finally:
+            self.__lock.release()
+        return completed
+
+    def transfer_time(self, size):
+        '''Returns the time a transfer of size bytes takes in seconds.'''
+        return self.__latency + size / self.__throughput
+
+
+class _InterruptEndpoint(object):
+    '''Packet queue of an interrupt endpoint.
+
+    Waiting uses select() on a pipe, as timed waits on Python locks poll.
+
+    '''
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__packets = collections.deque()
+        self.__readFd, self.__writeFd = os.pipe()
+
+    def clear(self):
+        '''Drops all pending packets.'''
+        while self.pop(0) is not None:
+            pass
+
+    def pop(self, timeout):
+        '''Returns the next packet, or None if there is none within timeout.'''
+        if not select.select([self.__readFd], [], [], timeout)[0]:
+            return None
+        self.__lock.acquire()
+        try:
+            os.read(self.__readFd, 1)
+            return self.__packets.popleft()
+        finally:
+            self.__lock.release()
+
+    def push(self, packet):
+        '''Appends a packet.'''
+        self.__lock.acquire()
+        try:
+            self.__packets.append(tuple(packet))
+            os.write(self.__writeFd, 'x')
+        finally:
+            self.__lock.release()
+
+
+class SimulatedHandle(object):
+    '''USB device handle of the simulated G19.
+
+    Implements the subset of the pyusb handle interface used by G19.
+
+    '''
+
+    def __init__(self, device, outEndpoints, inEndpoints, connection):
+        self.__device = device
+        self.__outEndpoints = frozenset(outEndpoints)
+        self.__inEndpoints = frozenset(inEndpoints)
+        # handles of earlier connections fail like those of an unplugged
+        # device
+        self.__connection = connection
+
+    def bulkWrite(self, endpoint, buffer, timeout=100):
+        if endpoint not in self.__outEndpoints:
+            raise usb.USBError("invalid endpoint: {0:#04x}".format(endpoint))
+        self.__device._check_connection(self.__connection)
+        return self.__device._bulk_write(endpoint, buffer, timeout)
+
+    def controlMsg(self, requestType, request, buffer, value=0, index=0,
+            timeout=100):
+        self.__device._check_connection(self.__connection)
+        return self.__device._control_msg(requestType, request, buffer,
+                value, index, timeout)
+
+    def interruptRead(self, endpoint, size, timeout=100):
+        if endpoint not in self.__inEndpoints:
+            raise usb.USBError("invalid endpoint: {0:#04x}".format(endpoint))
+        self.__device._check_connection(self.__connection)
+        packet = self.__device._interrupt_read(endpoint, size, timeout)
+        # unplugging wakes up pending reads
+        self.__device._check_connection(self.__connection)
+        return packet
+
+    def reset(self):
+        self.__device._check_connection(self.__connection)
+        self.__device._reset_handle()
+
+
+class SimulatedG19UsbController(object):
+    '''Drop-in replacement for G19UsbController not needing any hardware.
+
+    The handles behave like the ones of a G19:
+        * handleIf0: bulk endpoint 0x02 (LCD), interrupt endpoint 0x81
+          (display keys)
+        * handleIf1: control messages, interrupt endpoint 0x83 (G, M and
+          light keys)
+        * handleIfMM: interrupt endpoint 0x82 (multimedia keys)
+
+    Interrupt reads return packets given to feed_packet() or play() and
+    raise usb.USBError on timeout, like pyusb does.
+
+    '''
+
+    def __init__(self, bus=None, maxFrames=100):
+        '''Creates a simulated device.
+
+        @param bus UsbBusModel timing all transfers.  If None, a default
+        model will be used.
+        @param maxFrames Number of most recent bulk transfers kept by
+        get_frames().  If None, all of them are kept.
+
+        '''
+        if bus is None:
+            bus = UsbBusModel()
+        self.__bus = bus
+        self.__lock = threading.Lock()
+        self.__frames = collections.deque(maxlen=maxFrames)
+        self.__controlMessages = []
+        self.__endpoints = {}
+        for endpoint in (EP_DISPLAY_KEYS, EP_MULTIMEDIA_KEYS, EP_G_KEYS):
+            self.__endpoints[endpoint] = _InterruptEndpoint()
+        self.__framesWritten = 0
+        self.__reads = 0
+        self.__resets = 0
+        self.__timeouts = 0
+        self.__plugged = True
+        # number of the current connection, None while unplugged
+        self.__connection = None
+        self.__connections = 0
+        self.reconnect()
+
+    def clear_capture(self):
+        '''Forgets all captured frames and control messages.'''
+        self.__lock.acquire()
+        try:
+            self.__frames.clear()
+            del self.__controlMessages[:]
+        finally:
+            self.__lock.release()
+
+    def feed_packet(self, endpoint, packet):
+        '''Queues a packet to be returned by a read of given endpoint.
+
+        @param endpoint 0x81, 0x82 or 0x83.
+        @param packet Sequence of byte values, as the device sends them.
+
+        '''
+        self.__endpoints[endpoint].push(packet)
+
+    def get_bus(self):
+        '''Returns the UsbBusModel of this device.'''
+        return self.__bus
+
+    def get_control_messages(self):
+        '''Returns the control messages sent so far.
+
+        @return List of (time, requestType, request, data, value, index).
+        data is a tuple of byte values, or the number of bytes requested for
+        reading messages.
+
+        '''
+        self.__lock.acquire()
+        try:
+            return list(self.__controlMessages)
+        finally:
+            self.__lock.release()
+
+    def get_frames(self):
+        '''Returns the most recent bulk transfers to the LCD.
+
+        @return List of (time, data), data being a str including the frame
+        header.
+
+        '''
+        self.__lock.acquire()
+        try:
+            return list(self.__frames)
+        finally:
+            self.__lock.release()
+
+    def get_statistics(self):
+        '''Returns the usage of the device.
+
+        @return Dictionary containing the numbers of bulk transfers
+        ('frames'), control messages ('controlMessages'), interrupt reads
+        ('reads'), transfers which timed out ('timeouts'), handle resets
+        ('resets') and handles opened per interface ('connections'), plus
+        the bus statistics (see UsbBusModel.get_statistics()).
+
+        '''
+        self.__lock.acquire()
+        try:
+            result = {'frames': self.__framesWritten,
+                    'connections': self.__connections,
+                    'controlMessages': len(self.__controlMessages),
+                    'reads': self.__reads,
+                    'timeouts': self.__timeouts,
+                    'resets': self.__resets}
+        finally:
+            self.__lock.release()
+        result.update(self.__bus.get_statistics())
+        return result
+
+    def plug(self):
+        '''Plugs the device in again.
+
+        Its handles stay invalid until reconnect() is called.
+
+        '''
+        self.__lock.acquire()
+        try:
+            self.__plugged = True
+        finally:
+            self.__lock.release()
+
+    def play(self, script):
+        '''Feeds scripted packets in the background.
+
+        @param script Iterable of (offset, endpoint, packet), offset being
+        the time in seconds after the call at which to feed the packet.
+        Items must be ordered by offset.
+        @return The started thread feeding the packets.
+
+        '''
+        start = time.time()
+        def feed():
+            for offset, endpoint, packet in script:
+                delay = start + offset - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                self.feed_packet(endpoint, packet)
+        thread = threading.Thread(target=feed)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def reconnect(self):
+        '''Opens new handles, like G19UsbController.reconnect().
+
+        @raise usb.USBError if the device is unplugged.
+
+        '''
+        self.__lock.acquire()
+        try:
+            if not self.__plugged:
+                raise usb.USBError("G19 LCD not found on USB bus")
+            self.__connections += 1
+            self.__connection = self.__connections
+            connection = self.__connection
+        finally:
+            self.__lock.release()
+        for endpoint in self.__endpoints.values():
+            endpoint.clear()
+        self.handleIf0 = SimulatedHandle(self, [EP_LCD], [EP_DISPLAY_KEYS],
+                connection)
+        self.handleIf1 = SimulatedHandle(self, [], [EP_G_KEYS], connection)
+        self.handleIfMM = SimulatedHandle(self, [], [EP_MULTIMEDIA_KEYS],
+                connection)
+
+    def reset(self):
+        '''Resets the device on the USB.'''
+        self.handleIf0.reset()
+        self.handleIf1.reset()
+
+    def unplug(self):
+        '''Disconnects the device.
+
+        All transfers fail like pyusb ones do for an unplugged device, until
+        the device is plugged in again and reconnected.
+
+        '''
+        self.__lock.acquire()
+        try:
+            self.__plugged = False
+            self.__connection = None
+        finally:
+            self.__lock.release()
+        for endpoint in self.__endpoints.values():
+            endpoint.push(())
+
+    def _bulk_write(self, endpoint, buffer, timeout):
+        # the USB layer only transmits the low byte of list items
+        if isinstance(buffer, list):
+            data = str(bytearray(val & 0xff for val in buffer))
+        else:
+            data = str(buffer)
+        if not self.__bus.transfer(len(data), timeout):
+            self.__count_timeout()
+            raise usb.USBError("Connection timed out")
+        self.__lock.acquire()
+        try:
+            self.__frames.append((time.time(), data))
+            self.__framesWritten += 1
+        finally:
+            self.__lock.release()
+        return len(data)
+
+    def _check_connection(self, connection):
+        '''Raises usb.USBError if a handle's connection is gone.'''
+        self.__lock.acquire()
+        try:
+            if connection != self.__connection:
+                raise usb.USBError(DEVICE_LOST_MESSAGE)
+        finally:
+            self.__lock.release()
+
+    def _control_msg(self, requestType, request, buffer, value, index,
+            timeout):
+        if isinstance(buffer, (int, long)):
+            data = buffer
+            size = buffer
+        else:
+            if isinstance(buffer, basestring):
+                buffer = bytearray(buffer)
+            data = tuple(val & 0xff for val in buffer)
+            size = len(data)
+        if not self.__bus.transfer(size, timeout):
+            self.__count_timeout()
+            raise usb.USBError("Connection timed out")
+        self.__lock.acquire()
+        try:
+            self.__controlMessages.append(
+                    (time.time(), requestType, request, data, value, index))
+        finally:
+            self.__lock.release()
+        if isinstance(data, tuple):
+            return size
+        return (0,) * size
+
+    def _interrupt_read(self, endpoint, size, timeout):
+        self.__lock.acquire()
+        try:
+            self.__reads += 1
+        finally:
+            self.__lock.release()
+        packet = self.__endpoints[endpoint].pop(timeout / 1000.0)
+        if packet is None:
+            self.__count_timeout()
+            raise usb.USBError("Connection timed out")
+        self.__bus.transfer(len(packet), timeout)
+        return packet[:size]
+
+    def _reset_handle(self):
+        self.__lock.acquire()
+        try:
+            self.__resets += 1
+        finally:
+            self.__lock.release()
+        for endpoint in self.__endpoints.values():
+            endpoint.clear()
+
+    def __count_timeout(self):
+        self.__lock.acquire()
+        try:
+            self.__timeouts += 1
+        finally:
+            self.__lock.release()
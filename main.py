@@ -1,8 +1,10 @@
 from logitech.g19 import G19
+from logitech.applets.clock.clock import Clock
 from logitech.applets.simple_bg_light.simple_bg_light import SimpleBgLight
 from logitech.applets.simple_display_brightness.simple_display_brightness \
         import SimpleDisplayBrightness
 from logitech.applets.xplanet.xplanet import Xplanet
+from logitech.g19_display import DisplayManager
 
 import time
 
@@ -13,13 +15,20 @@ if __name__ == '__main__':
         bgLight = SimpleBgLight(lg19)
         lg19.add_applet(bgLight)
 
-        xplanet = Xplanet(lg19)
+        displayManager = DisplayManager(lg19)
+        lg19.add_applet(displayManager)
+
+        xplanet = Xplanet(lg19, displayManager.create_screen("xplanet"))
         lg19.add_applet(xplanet)
 
+        clock = Clock(lg19, displayManager.create_screen("clock"))
+        clock.start()
+
         displayBrightness = SimpleDisplayBrightness(lg19)
         lg19.add_applet(displayBrightness)
         while True:
             time.sleep(10)
     finally:
+        clock.stop()
         xplanet.stop()
         lg19.stop_event_handling()